@@ -0,0 +1,369 @@
+import array
+import operator
+from collections.abc import Sequence
+from itertools import repeat
+from typing import Any, Iterable, List
+
+from .errors import GuythonRuntimeError
+
+try:
+    import numpy
+except ImportError:  # NumPy is optional, arrays then use the array module
+    numpy = None
+
+_COMPARISONS = frozenset([operator.eq, operator.ne, operator.lt, operator.le, operator.gt, operator.ge])
+
+
+def _check_number(value: Any) -> Any:
+    if type(value) not in (int, float, bool):
+        raise GuythonRuntimeError(f"Arrays can only hold numbers, got {type(value).__name__}")
+    return value
+
+
+def _typed(values: Iterable) -> array.array:
+    """Store numbers as 64-bit ints when they are all whole, otherwise as doubles"""
+    values = values if isinstance(values, (list, array.array)) else list(values)
+    try:
+        return array.array('q', values)
+    except TypeError:
+        pass
+    except OverflowError:
+        raise GuythonRuntimeError("Array value out of range for a 64-bit integer")
+    try:
+        return array.array('d', values)
+    except TypeError:
+        raise GuythonRuntimeError("Arrays can only hold numbers")
+
+
+def _element_wise(op, reflected: bool = False):
+    """Build an operator method applying op to each element"""
+    def method(self, other):
+        return self._apply(op, other, reflected)
+    return method
+
+
+class NumericArray:
+    """Fixed-type array of numbers with element-wise arithmetic and comparisons
+
+    Backed by a NumPy array when NumPy is importable, otherwise by the array
+    module with ints stored as 'q' and floats as 'd'. Comparisons give arrays
+    of booleans.
+    """
+
+    __slots__ = ('data', 'boolean')
+    __hash__ = None
+
+    def __init__(self, values: Iterable = ()):
+        if isinstance(values, NumericArray):
+            values = values.tolist()
+        values = [_check_number(value) for value in values]
+        if numpy is not None:
+            self.data = numpy.array(values, dtype=float if float in map(type, values) else numpy.int64)
+        else:
+            self.data = _typed(values)
+        self.boolean = False
+
+    @classmethod
+    def _wrap(cls, data: Any, boolean: bool = False) -> 'NumericArray':
+        result = cls.__new__(cls)
+        result.data = data
+        result.boolean = boolean
+        return result
+
+    @classmethod
+    def of_numbers(cls, values: List[Any]) -> 'NumericArray':
+        """An array of values already known to be ints and floats, without checking each one"""
+        if numpy is None:
+            return cls._wrap(_typed(values))
+        try:
+            return cls._wrap(numpy.array(values, dtype=float if float in map(type, values) else numpy.int64))
+        except OverflowError:
+            raise GuythonRuntimeError("Array value out of range for a 64-bit integer")
+
+    @classmethod
+    def zeros(cls, size: int) -> 'NumericArray':
+        """An int array of size zeros"""
+        if not isinstance(size, int) or size < 0:
+            raise GuythonRuntimeError("Array size must be a non-negative integer")
+        if numpy is not None:
+            return cls._wrap(numpy.zeros(size, dtype=numpy.int64))
+        return cls._wrap(array.array('q', [0]) * size)
+
+    def tolist(self) -> List[Any]:
+        """The elements as a plain list"""
+        if numpy is not None:
+            return self.data.tolist()
+        if self.boolean:
+            return [bool(value) for value in self.data]
+        return self.data.tolist()
+
+    def _operand(self, other: Any) -> Any:
+        """The data of the other operand, scalars are broadcast"""
+        if isinstance(other, NumericArray):
+            data = other.data
+        elif isinstance(other, (list, ArrayView)):
+            data = NumericArray(other).data
+        elif type(other) in (int, float, bool):
+            return other
+        else:
+            return NotImplemented
+        if len(data) != len(self.data):
+            raise GuythonRuntimeError(f"Array sizes differ ({len(self.data)} and {len(data)})")
+        return data
+
+    def _apply(self, op, other: Any, reflected: bool = False) -> Any:
+        other_data = self._operand(other)
+        if other_data is NotImplemented:
+            return NotImplemented
+        left, right = (other_data, self.data) if reflected else (self.data, other_data)
+        boolean = op in _COMPARISONS
+
+        if numpy is not None:
+            with numpy.errstate(divide='raise', invalid='raise'):
+                try:
+                    return self._wrap(op(left, right), boolean)
+                except FloatingPointError as e:
+                    raise ZeroDivisionError(str(e))
+
+        if isinstance(left, array.array) and isinstance(right, array.array):
+            values = list(map(op, left, right))
+        elif reflected:
+            values = list(map(op, repeat(left, len(right)), right))
+        else:
+            values = list(map(op, left, repeat(right, len(left))))
+        if boolean:
+            return self._wrap(array.array('b', values), True)
+        return self._wrap(_typed(values))
+
+    __add__ = _element_wise(operator.add)
+    __radd__ = _element_wise(operator.add, True)
+    __sub__ = _element_wise(operator.sub)
+    __rsub__ = _element_wise(operator.sub, True)
+    __mul__ = _element_wise(operator.mul)
+    __rmul__ = _element_wise(operator.mul, True)
+    __truediv__ = _element_wise(operator.truediv)
+    __rtruediv__ = _element_wise(operator.truediv, True)
+    __floordiv__ = _element_wise(operator.floordiv)
+    __rfloordiv__ = _element_wise(operator.floordiv, True)
+    __mod__ = _element_wise(operator.mod)
+    __rmod__ = _element_wise(operator.mod, True)
+    __pow__ = _element_wise(operator.pow)
+    __rpow__ = _element_wise(operator.pow, True)
+    __eq__ = _element_wise(operator.eq)
+    __ne__ = _element_wise(operator.ne)
+    __lt__ = _element_wise(operator.lt)
+    __le__ = _element_wise(operator.le)
+    __gt__ = _element_wise(operator.gt)
+    __ge__ = _element_wise(operator.ge)
+
+    def __abs__(self):
+        if numpy is not None:
+            return self._wrap(numpy.abs(self.data))
+        return self._wrap(array.array(self.data.typecode, map(abs, self.data)))
+
+    def __bool__(self):
+        raise GuythonRuntimeError("The truth value of an array is ambiguous, compare its sum or len instead")
+
+    def __len__(self):
+        return len(self.data)
+
+    def __iter__(self):
+        if numpy is not None:
+            return (value.item() for value in self.data)
+        return map(bool, self.data) if self.boolean else iter(self.data)
+
+    def __getitem__(self, index: Any) -> Any:
+        if isinstance(index, slice):
+            return self._wrap(self.data[index], self.boolean)
+        value = self.data[index]
+        if numpy is not None:
+            return value.item()
+        return bool(value) if self.boolean else value
+
+    def __setitem__(self, index: int, value: Any):
+        _check_number(value)
+        if self.boolean and type(value) is not bool:
+            # A number stored in a boolean array makes it numeric
+            self.data = self.data.astype(numpy.int64) if numpy is not None else array.array('q', self.data)
+            self.boolean = False
+        if isinstance(value, float):
+            if numpy is not None and self.data.dtype != float:
+                self.data = self.data.astype(float)
+            elif numpy is None and self.data.typecode != 'd':
+                self.data = array.array('d', self.data)
+        self.data[index] = value
+
+    def sum(self) -> Any:
+        """Sum of the elements"""
+        if numpy is not None:
+            return self.data.sum().item()
+        return sum(self.data)
+
+    def min(self) -> Any:
+        """Smallest element"""
+        if not len(self.data):
+            raise ValueError("min() arg is an empty sequence")
+        return self.data.min().item() if numpy is not None else min(self.data)
+
+    def max(self) -> Any:
+        """Largest element"""
+        if not len(self.data):
+            raise ValueError("max() arg is an empty sequence")
+        return self.data.max().item() if numpy is not None else max(self.data)
+
+    def __str__(self):
+        return str(self.tolist())
+
+    def __repr__(self):
+        return f"array({self.tolist()})"
+
+
+def _through_copy(op, reflected: bool = False):
+    """Build an operator method applying op to a copy of the view"""
+    def method(self, other):
+        if isinstance(other, ArrayView):
+            other = other.copy()
+        return op(other, self.copy()) if reflected else op(self.copy(), other)
+    return method
+
+
+class ArrayView:
+    """A slice of a list or array that reads and writes through to it without copying
+
+    The view holds its base and a range of base indices, slicing a view
+    narrows the range. Arithmetic works on a copy with the base's semantics,
+    element-wise for arrays and concatenation for lists.
+    """
+
+    __slots__ = ('base', 'indices')
+    __hash__ = None
+
+    def __init__(self, base: Any, indices: range):
+        self.base = base
+        self.indices = indices
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, index: Any) -> Any:
+        if isinstance(index, slice):
+            return ArrayView(self.base, self.indices[index])
+        return self.base[self.indices[index]]
+
+    def __setitem__(self, index: int, value: Any):
+        self.base[self.indices[index]] = value
+
+    def __iter__(self):
+        base = self.base
+        return (base[index] for index in self.indices)
+
+    def tolist(self) -> List[Any]:
+        """The elements as a plain list"""
+        return list(self)
+
+    def copy(self) -> Any:
+        """Copy the elements into a new array or list, matching the base"""
+        return NumericArray(self) if isinstance(self.base, NumericArray) else list(self)
+
+    __add__ = _through_copy(operator.add)
+    __radd__ = _through_copy(operator.add, True)
+    __sub__ = _through_copy(operator.sub)
+    __rsub__ = _through_copy(operator.sub, True)
+    __mul__ = _through_copy(operator.mul)
+    __rmul__ = _through_copy(operator.mul, True)
+    __truediv__ = _through_copy(operator.truediv)
+    __rtruediv__ = _through_copy(operator.truediv, True)
+    __floordiv__ = _through_copy(operator.floordiv)
+    __rfloordiv__ = _through_copy(operator.floordiv, True)
+    __mod__ = _through_copy(operator.mod)
+    __rmod__ = _through_copy(operator.mod, True)
+    __pow__ = _through_copy(operator.pow)
+    __rpow__ = _through_copy(operator.pow, True)
+    __eq__ = _through_copy(operator.eq)
+    __ne__ = _through_copy(operator.ne)
+    __lt__ = _through_copy(operator.lt)
+    __le__ = _through_copy(operator.le)
+    __gt__ = _through_copy(operator.gt)
+    __ge__ = _through_copy(operator.ge)
+
+    def __str__(self):
+        return str(self.tolist())
+
+    def __repr__(self):
+        return f"view({self.tolist()})"
+
+
+SEQUENCE_TYPES = (list, NumericArray, ArrayView)
+# Values that can be indexed and sliced but not assigned to, such as the lines of readlines
+READ_ONLY_TYPES = (str, range, Sequence)
+
+
+def _check_index(sequence: Any, index: Any):
+    if not isinstance(index, int):
+        raise GuythonRuntimeError(f"Array index must be integer, got {type(index).__name__}")
+    if index < 0 or index >= len(sequence):
+        raise GuythonRuntimeError(f"Array index {index} out of bounds (0-{len(sequence)-1})")
+
+
+def get_item(sequence: Any, index: Any) -> Any:
+    """Index a list, array, view, string or file lines, slices give views"""
+    if isinstance(index, slice):
+        return slice_view(sequence, index)
+    if not isinstance(sequence, READ_ONLY_TYPES + SEQUENCE_TYPES):
+        raise GuythonRuntimeError(f"Cannot index non-array value of type {type(sequence).__name__}")
+    _check_index(sequence, index)
+    return sequence[index]
+
+
+def slice_view(sequence: Any, bounds: slice) -> Any:
+    """Slice a sequence without copying its elements, strings and ranges are sliced as usual"""
+    for bound in (bounds.start, bounds.stop, bounds.step):
+        if bound is not None and not isinstance(bound, int):
+            raise GuythonRuntimeError(f"Slice bounds must be integers, got {type(bound).__name__}")
+    if isinstance(sequence, (str, range)):
+        return sequence[bounds]
+    if isinstance(sequence, NumericArray) and numpy is not None:
+        # NumPy slices are already views
+        return NumericArray._wrap(sequence.data[bounds], sequence.boolean)
+    if isinstance(sequence, ArrayView):
+        return ArrayView(sequence.base, sequence.indices[bounds])
+    if isinstance(sequence, SEQUENCE_TYPES + (Sequence,)):
+        return ArrayView(sequence, range(len(sequence))[bounds])
+    raise GuythonRuntimeError(f"Cannot slice non-array value of type {type(sequence).__name__}")
+
+
+def set_item(sequence: Any, index: Any, value: Any):
+    """Assign an element of a list, array or view"""
+    if not isinstance(sequence, SEQUENCE_TYPES):
+        raise GuythonRuntimeError(f"Cannot assign to index of non-array value of type {type(sequence).__name__}")
+    _check_index(sequence, index)
+    sequence[index] = value
+
+
+def make_array(*values: Any) -> NumericArray:
+    """array(1, 2, 3), or array(values) for a list or another array"""
+    if len(values) == 1 and isinstance(values[0], (list, tuple, NumericArray, ArrayView)):
+        values = values[0]
+    return NumericArray(values)
+
+
+def array_sum(values: Any, *start: Any) -> Any:
+    """sum() with a fast path for numeric arrays"""
+    if isinstance(values, NumericArray):
+        total = values.sum()
+        return total + start[0] if start else total
+    return sum(values, *start)
+
+
+def array_min(*values: Any, **kwargs: Any) -> Any:
+    """min() with a fast path for numeric arrays"""
+    if len(values) == 1 and not kwargs and isinstance(values[0], NumericArray):
+        return values[0].min()
+    return min(*values, **kwargs)
+
+
+def array_max(*values: Any, **kwargs: Any) -> Any:
+    """max() with a fast path for numeric arrays"""
+    if len(values) == 1 and not kwargs and isinstance(values[0], NumericArray):
+        return values[0].max()
+    return max(*values, **kwargs)
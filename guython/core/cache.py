@@ -0,0 +1,98 @@
+import marshal
+import os
+from typing import Any, List, Optional
+
+from .compiler import DECODE_FORMAT, Instruction, NO_CONSTANT
+from .constants import VERSION
+from .evaluator import ParsedExpression
+
+CACHE_DIR = '__gycache__'
+CACHE_MAGIC = b'GYC\x02'
+
+
+def cache_path(filename: str) -> str:
+    """Get the compiled-program cache path for a source file, named after the whole file name
+
+    Keeping the extension keeps prog.gy and prog.guy from sharing a cache file.
+    """
+    directory, name = os.path.split(os.path.abspath(filename))
+    return os.path.join(directory, CACHE_DIR, f"{name}.{VERSION}.gyc")
+
+
+def decode_key(aliases, statements) -> str:
+    """Describe the interpreter state a program was decoded with"""
+    return repr((sorted(aliases.items()), sorted(statements.words)))
+
+
+def _encode_value(value: Any) -> Any:
+    """Turn an operand into plain marshal data, operand tuples are stored as lists"""
+    if isinstance(value, tuple):
+        return [_encode_value(item) for item in value]
+    if isinstance(value, ParsedExpression):
+        # Only the source is stored, the tree is parsed again on first use
+        return ('e', value.source)
+    if value is NO_CONSTANT:
+        return ('n',)
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    """Rebuild an operand stored by _encode_value"""
+    if isinstance(value, list):
+        return tuple(_decode_value(item) for item in value)
+    if isinstance(value, tuple):
+        return ParsedExpression(value[1]) if value[0] == 'e' else NO_CONSTANT
+    return value
+
+
+def encode_program(program: List[Instruction]) -> bytes:
+    """Serialise decoded instructions into the compact .gyc body"""
+    return marshal.dumps([
+        (instr.kind, instr.indent, instr.code, instr.line_number, instr.source,
+         _encode_value(instr.operands), _encode_value(instr.expr))
+        for instr in program
+    ])
+
+
+def decode_cached_program(data: bytes) -> List[Instruction]:
+    """Rebuild decoded instructions from a .gyc body"""
+    return [
+        Instruction(kind, indent, code, line_number, source,
+                    _decode_value(operands), _decode_value(expr))
+        for kind, indent, code, line_number, source, operands, expr in marshal.loads(data)
+    ]
+
+
+def load_cached_program(filename: str, key: str) -> Optional[List]:
+    """Load a decoded program if its cache entry is still valid"""
+    try:
+        stat = os.stat(filename)
+        with open(cache_path(filename), 'rb') as f:
+            if f.read(len(CACHE_MAGIC)) != CACHE_MAGIC:
+                return None
+            header = marshal.load(f)
+            if header != (VERSION, DECODE_FORMAT, stat.st_mtime_ns, stat.st_size, key):
+                return None
+            return decode_cached_program(f.read())
+    except (OSError, EOFError, ValueError, TypeError, IndexError):
+        return None
+
+
+def save_cached_program(filename: str, key: str, program: List):
+    """Store a decoded program next to its source, ignoring unwritable directories"""
+    path = cache_path(filename)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        stat = os.stat(filename)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = encode_program(program)
+        with open(temp_path, 'wb') as f:
+            f.write(CACHE_MAGIC)
+            marshal.dump((VERSION, DECODE_FORMAT, stat.st_mtime_ns, stat.st_size, key), f)
+            f.write(data)
+        os.replace(temp_path, path)
+    except (OSError, ValueError):
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
@@ -0,0 +1,782 @@
+import ast
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .constants import QUICKEN_BACKOFF, QUICKEN_WARMUP, RESERVED_FUNCTIONS, SAFE_OPERATIONS
+from .evaluator import ExpressionEvaluator, ParsedExpression
+from .variables import symbols
+
+
+# Commands that are recognised before loop-body collection and false-if
+# skipping, in the order the interpreter checks them.
+STRUCTURAL_KINDS = frozenset([
+    'eval', 'input', 'input_assign', 'alias', 'else', 'exit', 'gpd',
+    'def', 'while', 'for', 'if',
+])
+
+# Keywords that can never start a function call statement
+CALL_EXCLUDED_PREFIXES = (
+    'def', 'while', 'if', 'print', 'input', 'alias', 'else', 'exit', 'gpd',
+    'goto', 'guython', 'read', 'write', 'import',
+)
+
+NO_CONSTANT = object()
+
+# Bumped whenever decoded operands change shape, so older cached programs are decoded again
+DECODE_FORMAT = 7
+
+# Precedence of the statement kinds, lowest rank is checked first
+RANK_INPUT_ASSIGN = 30
+RANK_REGISTERED = 125
+RANK_CALL = 130
+RANK_ASSIGN = 150
+RANK_NONE = 1000
+
+# Statement kinds that open a block of deeper indented lines
+BLOCK_KINDS = frozenset(['if', 'else', 'while', 'for', 'def'])
+
+# Statement kinds whose first operand names the variable they assign
+TARGET_KINDS = frozenset(['assign', 'input_assign', 'load_assign', 'for'])
+
+RESERVED_NAMES = ('import', 'print', 'if', 'while', 'def', 'goto', 'eval')
+
+# Opcodes of compiled code, each op is an (opcode, instruction, argument) tuple
+OP_EXEC = 0     # run the instruction's statement handler
+OP_BRANCH = 1   # if: jump to the argument when the condition is false
+OP_JUMP = 2     # jump to the argument
+OP_LOOP = 3     # while: jump to the argument when the condition is false
+OP_DEF = 4      # define a function whose compiled body is the argument
+OP_ERROR = 5    # raise a syntax error with the argument as message
+OP_GOTO = 6     # goto a line of the same code, the argument is its op
+OP_CALL = 7     # call a Guython function, its body runs on the executor's call stack
+
+# Superinstructions fused from common statement shapes, each falls back to
+# the general statement when its variable is missing or not a number
+OP_INCREMENT = 8        # x=x+N: add the constant to a variable slot, argument (slot, delta)
+OP_COMPARE_BRANCH = 9   # ifx<N: argument (false target, slot, compare, constant)
+OP_COMPARE_LOOP = 10    # whilex<N: argument (exit target, slot, compare, constant)
+OP_PRINT = 11           # print"text",x: argument is (literal, slot) parts, spaces and newline included
+OP_BINARY = 12          # x=a+b: argument is a BinarySite that specialises on operand types
+
+# A for loop starts its iterator once, then each pass stores the next value in the loop variable
+OP_GET_ITER = 13    # for: evaluate the iterable and start the loop, argument is the exit target
+OP_FOR_ITER = 14    # for: store the next value, jump to the argument when it is used up
+
+# Entering a while loop from outside, not by its closing jump, starts its iteration count over
+OP_SETUP_LOOP = 15  # while: clear the state of the loop op that follows
+
+OPCODE_NAMES = ('EXEC', 'BRANCH', 'JUMP', 'LOOP', 'DEF', 'ERROR', 'GOTO', 'CALL',
+                'INCR', 'CMPBR', 'CMPLP', 'PRINT', 'BINARY', 'ITER', 'FOR', 'SETUP')
+
+_COMPARISONS = frozenset(['==', '!=', '<', '<=', '>', '>='])
+
+# Operators a binary assignment can be specialised for, by operand type
+SPECIALISED_OPERATORS = {
+    int: frozenset(['+', '-', '*', '/', '//', '%']) | _COMPARISONS,
+    float: frozenset(['+', '-', '*', '/', '//', '%']) | _COMPARISONS,
+    str: frozenset(['+']) | _COMPARISONS,
+}
+
+_LEADING_WORD = re.compile(r'[^\W_]*')
+_FOR_LOOP = re.compile(r'for\s*([A-Za-z_]\w*)\s+in\s+(.+)$')
+_LOAD_ASSIGN = re.compile(r'([A-Za-z_]\w*)\s*=\s*(readlines|loadcsv|loadjson)\s+(.+)$')
+# An argument of a load, quoted when it has spaces
+_LOAD_ARGUMENT = re.compile(r'"([^"]*)"|\'([^\']*)\'|(\S+)')
+_VARIABLE_NAME = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+# Fused ops only take names without underscores, 'name_' is call syntax in expressions
+_PLAIN_NAME = r'[A-Za-z][A-Za-z0-9]*'
+_NUMBER = r'(?:0|[1-9][0-9]*)(?:\.[0-9]+)?'
+_OPERAND = rf'(?:{_PLAIN_NAME}|{_NUMBER})'
+_PLAIN_VARIABLE = re.compile(rf'^{_PLAIN_NAME}$')
+_INCREMENT = re.compile(rf'^({_PLAIN_NAME})\s*([+-])\s*({_NUMBER})$')
+_COMPARE = re.compile(rf'^({_PLAIN_NAME})\s*(==|!=|<=|>=|<|>)\s*({_NUMBER})$')
+_BINARY = re.compile(rf'^({_OPERAND})\s*(//|==|!=|<=|>=|[-+*/%<>])\s*({_OPERAND})$')
+
+
+class Instruction:
+    """A decoded Guython source line"""
+
+    __slots__ = ('kind', 'indent', 'code', 'line_number', 'source', 'operands', 'expr', 'target')
+
+    def __init__(self, kind: str, indent: int, code: str, line_number: int, source: str,
+                 operands: Tuple = (), expr: Any = None):
+        self.kind = kind
+        self.indent = indent
+        self.code = code
+        self.line_number = line_number
+        self.source = source
+        self.operands = operands
+        self.expr = expr
+        self.target = None  # Slot of the assigned variable, None if the name is invalid
+        if kind in TARGET_KINDS:
+            resolve_target(self)
+
+    def __repr__(self):
+        return f"Instruction({self.kind!r}, indent={self.indent}, line={self.line_number}, code={self.code!r})"
+
+
+def strip_comments(line: str) -> str:
+    """Remove comments from a line"""
+    result = ''
+    i = 0
+    while i < len(line):
+        if line[i] == '{':
+            end = line.find('}', i + 1)
+            if end != -1:
+                i = end + 1
+            else:
+                break
+        else:
+            result += line[i]
+            i += 1
+    return result.strip()
+
+
+def get_indent_level(line: str) -> Tuple[int, str]:
+    """Get indentation level and code"""
+    indent = 0
+    while indent < len(line) and line[indent] == '.':
+        indent += 1
+    return indent, line[indent:]
+
+
+def split_outside_quotes(s: str, delimiter: str) -> List[str]:
+    """Split string by delimiter, ignoring delimiters inside quotes"""
+    result = []
+    current = ''
+    in_single = False
+    in_double = False
+
+    for c in s:
+        if c == "'" and not in_double:
+            in_single = not in_single
+            current += c
+        elif c == '"' and not in_single:
+            in_double = not in_double
+            current += c
+        elif c == delimiter and not in_single and not in_double:
+            result.append(current)
+            current = ''
+        else:
+            current += c
+
+    result.append(current)
+    return result
+
+
+def split_assignment(code: str) -> Tuple[str, str]:
+    """Split an assignment at its '=', skipping any inside brackets, quotes or comparisons"""
+    depth = 0
+    quote = None
+    for i, c in enumerate(code):
+        if quote:
+            if c == quote:
+                quote = None
+        elif c in '"\'':
+            quote = c
+        elif c in '[(':
+            depth += 1
+        elif c in '])':
+            depth -= 1
+        elif c == '=' and depth == 0 and code[i + 1:i + 2] != '=' and code[i - 1:i] not in ('=', '!', '<', '>'):
+            return code[:i], code[i + 1:]
+    return tuple(code.split('=', 1))
+
+
+def tokenize_print_args(args_str: str) -> List[str]:
+    """Tokenize print arguments"""
+    tokens = []
+    current = ''
+    in_single = False
+    in_double = False
+    i = 0
+
+    while i < len(args_str):
+        c = args_str[i]
+
+        if c == "'" and not in_double:
+            if in_single:
+                current += c
+                tokens.append(current)
+                current = ''
+                in_single = False
+            else:
+                if current:
+                    tokens.append(current)
+                    current = ''
+                current = c
+                in_single = True
+
+        elif c == '"' and not in_single:
+            if in_double:
+                current += c
+                tokens.append(current)
+                current = ''
+                in_double = False
+            else:
+                if current:
+                    tokens.append(current)
+                    current = ''
+                current = c
+                in_double = True
+
+        elif c == ' ' and not in_single and not in_double:
+            if current:
+                tokens.append(current)
+                current = ''
+
+        else:
+            current += c
+
+        i += 1
+
+    if current:
+        tokens.append(current)
+
+    return tokens
+
+
+def is_valid_variable_name(name: str) -> bool:
+    """Check that a name can be used for a variable"""
+    if not _VARIABLE_NAME.match(name):
+        return False
+    return name not in RESERVED_FUNCTIONS and name not in RESERVED_NAMES
+
+
+def resolve_target(instr: Instruction):
+    """Resolve the variable an instruction assigns to its slot"""
+    if instr.operands and is_valid_variable_name(instr.operands[0]):
+        instr.target = symbols.slot(instr.operands[0])
+    else:
+        instr.target = None
+
+
+def is_quoted(text: str) -> bool:
+    """Check whether text is a single or double quoted string literal"""
+    return (text.startswith('"') and text.endswith('"')) or \
+           (text.startswith("'") and text.endswith("'"))
+
+
+def try_parse(expr: str) -> Any:
+    """Parse an expression ahead of time, leaving errors for execution"""
+    try:
+        return ExpressionEvaluator.parse(expr)
+    except Exception:
+        return None
+
+
+def _literal_argument(arg: str) -> Any:
+    """Return the constant value of a literal call argument"""
+    if is_quoted(arg):
+        return arg[1:-1]
+    try:
+        return float(arg) if '.' in arg else int(arg)
+    except ValueError:
+        return NO_CONSTANT
+
+
+class StatementTable:
+    """Classifies statements by their leading word in a single lexer pass"""
+
+    def __init__(self):
+        # keyword -> [(rank, kind, predicate)], matched as a prefix of the leading word
+        self.keywords: Dict[str, List[Tuple[int, str, Optional[Callable[[str], bool]]]]] = {}
+        # whole-word statements registered by the GUI, file commands and packages
+        self.words: set = set()
+        self.lengths: Tuple[int, ...] = ()
+        self.version = 0
+
+    def add_keyword(self, keyword: str, kind: str, rank: int,
+                    predicate: Optional[Callable[[str], bool]] = None):
+        """Add a built-in keyword that may be written without a following space"""
+        self.keywords.setdefault(keyword, []).append((rank, kind, predicate))
+        self.lengths = tuple(sorted(set(self.lengths) | {len(keyword)}))
+
+    def register(self, word: str):
+        """Register a whole-word statement such as 'createWindow', decoded with its word as kind"""
+        if not word or not _LEADING_WORD.fullmatch(word):
+            raise ValueError(f"Invalid statement keyword: '{word}'")
+        self.words.add(word)
+        self.version += 1
+
+    def copy(self) -> 'StatementTable':
+        """Copy the table so an interpreter can register its own statements"""
+        table = StatementTable()
+        table.keywords = {keyword: list(entries) for keyword, entries in self.keywords.items()}
+        table.words = set(self.words)
+        table.lengths = self.lengths
+        table.version = self.version
+        return table
+
+    def classify(self, code: str) -> str:
+        """Pick the command kind of a line, following the interpreter's precedence"""
+        word = _LEADING_WORD.match(code).group()
+        best_rank = RANK_NONE
+        best_kind = None
+
+        for length in self.lengths:
+            entries = self.keywords.get(word[:length])
+            if entries:
+                for rank, kind, predicate in entries:
+                    if rank < best_rank and (predicate is None or predicate(code)):
+                        best_rank, best_kind = rank, kind
+
+        if best_rank > RANK_REGISTERED and word in self.words:
+            best_rank, best_kind = RANK_REGISTERED, word
+
+        # Statements recognised by their shape rather than a leading keyword
+        if best_rank > RANK_INPUT_ASSIGN and (
+                ('=input"' in code and code.count('"') == 2) or
+                ("=input '" in code and code.count("'") == 2)):
+            return 'input_assign'
+        if best_rank > RANK_INPUT_ASSIGN and ('load' in code or 'readlines' in code) and _LOAD_ASSIGN.match(code):
+            return 'load_assign'
+        if best_rank > RANK_CALL and ('_ ' in code or code.endswith('_')) \
+                and not code.startswith(CALL_EXCLUDED_PREFIXES):
+            return 'call'
+        if best_rank > RANK_ASSIGN and '=' in code and not code.startswith('print') and code != "5+5=4":
+            return 'item_assign' if '[' in code.split('=', 1)[0] else 'assign'
+        if best_kind is not None:
+            return best_kind
+
+        if code in ("5+5=4", "9+10", "ver"):
+            return 'easter_egg'
+        if '[' in code and ']' in code and '=' not in code:
+            return 'array_access'
+        return 'expr'
+
+
+DEFAULT_STATEMENTS = StatementTable()
+DEFAULT_STATEMENTS.add_keyword('eval', 'eval', 10, lambda code: code.startswith('eval '))
+DEFAULT_STATEMENTS.add_keyword('input', 'input', 20, lambda code: (
+    (code.startswith('input"') and code.endswith('"')) or
+    (code.startswith("input'") and code.endswith("'"))))
+DEFAULT_STATEMENTS.add_keyword('alias', 'alias', 40, lambda code: code.startswith('alias '))
+DEFAULT_STATEMENTS.add_keyword('else', 'else', 50)
+DEFAULT_STATEMENTS.add_keyword('exit', 'exit', 60, lambda code: code.startswith('exit_'))
+DEFAULT_STATEMENTS.add_keyword('gpd', 'gpd', 70, lambda code: code.startswith('gpd '))
+DEFAULT_STATEMENTS.add_keyword('def', 'def', 80)
+DEFAULT_STATEMENTS.add_keyword('while', 'while', 90)
+DEFAULT_STATEMENTS.add_keyword('for', 'for', 95, lambda code: _FOR_LOOP.match(code) is not None)
+DEFAULT_STATEMENTS.add_keyword('if', 'if', 100)
+DEFAULT_STATEMENTS.add_keyword('goto', 'goto', 110)
+DEFAULT_STATEMENTS.add_keyword('guython', 'guython', 120)
+DEFAULT_STATEMENTS.add_keyword('printinput', 'print_input', 140)
+DEFAULT_STATEMENTS.add_keyword('print', 'print_input', 140, lambda code: code.startswith('print input'))
+DEFAULT_STATEMENTS.add_keyword('print', 'print', 160)
+
+
+def _strip_keyword(code: str, keyword: str) -> str:
+    """Remove a leading keyword written with or without a space"""
+    if code.startswith(keyword + ' '):
+        return code[len(keyword) + 1:].strip()
+    return code[len(keyword):].strip()
+
+
+def _decode_operands(instr: Instruction):
+    """Pre-split the operands and parse the expressions of an instruction"""
+    kind = instr.kind
+    code = instr.code
+
+    if kind == 'eval':
+        source = code[4:].strip()
+        instr.operands = (source,)
+        instr.expr = try_parse(source)
+
+    elif kind == 'input':
+        instr.operands = (code[6:-1],)
+
+    elif kind == 'input_assign':
+        separator = '=input"' if '=input"' in code else "=input '"
+        var_name, prompt = code.split(separator, 1)
+        instr.operands = (var_name.strip(), prompt[:-1])
+        resolve_target(instr)
+
+    elif kind == 'load_assign':
+        # x = loadcsv -rows 10 {filePath} {fileName}, the arguments are split with their quotes removed
+        match = _LOAD_ASSIGN.match(code)
+        arguments = tuple(next(part for part in found.groups() if part is not None)
+                          for found in _LOAD_ARGUMENT.finditer(match.group(3)))
+        instr.operands = (match.group(1), match.group(2), arguments)
+        resolve_target(instr)
+
+    elif kind == 'alias':
+        _, rest = code.split("alias", 1)
+        if '=' in rest:
+            name, target = rest.strip().split("=", 1)
+            instr.operands = (name.strip(), target.strip())
+
+    elif kind in ('while', 'if'):
+        condition = _strip_keyword(code, kind)
+        instr.operands = (condition,)
+        if condition:
+            instr.expr = try_parse(condition)
+
+    elif kind == 'for':
+        match = _FOR_LOOP.match(code)
+        instr.operands = (match.group(1), match.group(2).strip())
+        instr.expr = try_parse(instr.operands[1])
+        resolve_target(instr)
+
+    elif kind == 'goto':
+        # The target line is resolved to an op or program index when loading
+        line_str = _strip_keyword(code, 'goto')
+        instr.operands = (line_str, int(line_str) if line_str.isdigit() else None)
+
+    elif kind == 'call':
+        if ' ' in code:
+            func_name, args_str = code.split(' ', 1)
+            args_str = args_str.strip()
+            passed_args = [arg.strip() for arg in args_str.split(',')] if args_str else []
+        else:
+            func_name = code.strip()
+            passed_args = []
+        arguments = []
+        for arg in passed_args:
+            value = _literal_argument(arg)
+            node = try_parse(arg) if value is NO_CONSTANT else None
+            arguments.append((arg, value, node))
+        instr.operands = (func_name, tuple(arguments))
+
+    elif kind == 'assign':
+        var_name, expr = code.split('=', 1)
+        expr = expr.strip()
+        instr.operands = (var_name.strip(), expr)
+        instr.expr = try_parse(expr)
+        resolve_target(instr)
+
+    elif kind == 'item_assign':
+        # x[i][j]=v assigns index j of the container x[i], both parsed once here
+        target, expr = split_assignment(code)
+        target = target.strip()
+        expr = expr.strip()
+        container = index = None
+        parsed = try_parse(target)
+        # Slices can't be assigned, nor stored in the program cache as an expression
+        if parsed is not None and isinstance(parsed.node, ast.Subscript) \
+                and not isinstance(parsed.node.slice, ast.Slice):
+            node = parsed.node
+            container = ParsedExpression(ast.unparse(node.value), node.value)
+            index = ParsedExpression(ast.unparse(node.slice), node.slice)
+        instr.operands = (target, expr, container, index)
+        instr.expr = try_parse(expr)
+
+    elif kind == 'print':
+        rest = code[5:].strip()
+        chunks = []
+        if rest:
+            for chunk in split_outside_quotes(rest, ','):
+                tokens = []
+                for token in tokenize_print_args(chunk.strip()):
+                    token = token.strip()
+                    if is_quoted(token):
+                        tokens.append((token[1:-1], None, None))
+                    else:
+                        tokens.append((None, token, try_parse(token)))
+                chunks.append(tuple(tokens))
+        instr.operands = tuple(chunks)
+
+    elif kind in ('expr', 'array_access'):
+        instr.expr = try_parse(code)
+
+
+def decode_line(line: str, line_number: int = 0,
+                aliases: Optional[Dict[str, str]] = None,
+                statements: StatementTable = DEFAULT_STATEMENTS) -> Instruction:
+    """Decode a single source line into an instruction record"""
+    source = line.rstrip("\n")
+    stripped = strip_comments(source)
+    if not stripped.strip():
+        return Instruction('empty', 0, '', line_number, source)
+
+    indent, code = get_indent_level(stripped)
+
+    # Apply aliases
+    if aliases:
+        for alias, replacement in aliases.items():
+            if code.startswith(alias + " "):
+                code = code.replace(alias, replacement, 1)
+
+    kind = statements.classify(code)
+    instr = Instruction(kind, indent, code, line_number, source)
+    if kind in statements.words:
+        # Registered statements get the text after their keyword
+        instr.operands = (code[len(kind):].strip(),)
+    else:
+        _decode_operands(instr)
+    return instr
+
+
+class CodeBlock:
+    """Instructions compiled into a flat list of ops with resolved jump targets"""
+
+    __slots__ = ('ops', 'lines')
+
+    def __init__(self, ops: List[Tuple[int, Instruction, Any]], lines: Dict[int, int]):
+        self.ops = ops
+        self.lines = lines  # source line number -> first op of that line, the goto jump table
+
+    def dump(self) -> str:
+        """Describe the compiled ops, one per line"""
+        lines = []
+        for pc, (opcode, instr, arg) in enumerate(self.ops):
+            if opcode in (OP_BRANCH, OP_JUMP, OP_LOOP, OP_GOTO, OP_GET_ITER, OP_FOR_ITER):
+                target = f" -> {arg}"
+            elif opcode in (OP_COMPARE_BRANCH, OP_COMPARE_LOOP):
+                target = f" -> {arg[0]}"
+            elif opcode == OP_BINARY:
+                target = f" ({arg!r})"
+            else:
+                target = ''
+            lines.append(f"{pc:4} {OPCODE_NAMES[opcode]:<6} [Line {instr.line_number}] {instr.code}{target}")
+        return '\n'.join(lines)
+
+    def __repr__(self):
+        return f"CodeBlock({len(self.ops)} ops)"
+
+
+class Block:
+    """A structural line with its body, the instructions in [start + 1, end) of the program"""
+
+    __slots__ = ('instr', 'start', 'end', 'body')
+
+    def __init__(self, instr: Instruction, start: int):
+        self.instr = instr
+        self.start = start
+        self.end = start + 1  # Precomputed offset of the first line after the block
+        self.body: List[Any] = []  # Instructions and nested blocks
+
+    def __repr__(self):
+        return f"Block({self.instr.kind!r}, line={self.instr.line_number}, lines={self.end - self.start})"
+
+
+def build_block_tree(instrs: List[Instruction]) -> List[Any]:
+    """Nest the instructions under the if/else/while/def lines whose body they are in"""
+    root: List[Any] = []
+    open_blocks: List[Block] = []
+
+    for index, instr in enumerate(instrs):
+        if instr.kind != 'empty':
+            # A line that is not indented deeper than a block closes it
+            while open_blocks and instr.indent <= open_blocks[-1].instr.indent:
+                open_blocks.pop().end = index
+
+        parent = open_blocks[-1].body if open_blocks else root
+        if instr.kind in BLOCK_KINDS:
+            block = Block(instr, index)
+            parent.append(block)
+            open_blocks.append(block)
+        else:
+            parent.append(instr)
+
+    for block in open_blocks:
+        block.end = len(instrs)
+    return root
+
+
+def _compile_nodes(nodes: List[Any], instrs: List[Instruction], ops: List[List],
+                   lines: Dict[int, int], fuse: bool, in_if: Optional[List[int]] = None):
+    """Compile block tree nodes into ops, in_if holds the false-path jumps of an enclosing if"""
+    previous_if = None
+    for node in nodes:
+        instr = node.instr if isinstance(node, Block) else node
+        kind = instr.kind
+        lines[instr.line_number] = len(ops)
+
+        if kind == 'empty':
+            continue
+
+        if kind == 'if':
+            # The branch jumps to the first else body, or past the block
+            false_jumps = [len(ops)]
+            ops.append([OP_BRANCH, instr, None])
+            _compile_nodes(node.body, instrs, ops, lines, fuse, false_jumps)
+            for index in false_jumps:
+                ops[index][2] = len(ops)
+            previous_if = instr
+            continue
+
+        if kind == 'while':
+            # The closing jump returns to the LOOP op, past the setup that a goto to the line runs
+            ops.append([OP_SETUP_LOOP, instr, None])
+            top = len(ops)
+            ops.append([OP_LOOP, instr, None])
+            _compile_nodes(node.body, instrs, ops, lines, fuse)
+            ops.append([OP_JUMP, instr, top])
+            ops[top][2] = len(ops)
+
+        elif kind == 'for':
+            # The closing jump returns to the FOR op, so only entering the loop starts a new iterator
+            start = len(ops)
+            ops.append([OP_GET_ITER, instr, None])
+            ops.append([OP_FOR_ITER, instr, None])
+            _compile_nodes(node.body, instrs, ops, lines, fuse)
+            ops.append([OP_JUMP, instr, start + 1])
+            ops[start][2] = ops[start + 1][2] = len(ops)
+
+        elif kind == 'def':
+            body = instrs[node.start + 1:node.end]
+            ops.append([OP_DEF, instr, (body, compile_tree(node.body, instrs, fuse))])
+
+        elif kind == 'else':
+            if in_if is None:
+                if previous_if is not None:
+                    message = "Else block must be indented under its matching if"
+                else:
+                    message = "Unexpected 'else' without matching 'if'"
+                ops.append([OP_ERROR, instr, message])
+            else:
+                # A true condition skips the else body, a false one runs it and leaves the if
+                skip = len(ops)
+                ops.append([OP_JUMP, instr, None])
+                for index in in_if:
+                    ops[index][2] = len(ops)
+                _compile_nodes(node.body, instrs, ops, lines, fuse)
+                in_if[:] = [len(ops)]
+                ops.append([OP_JUMP, instr, None])
+                ops[skip][2] = len(ops)
+
+        else:
+            ops.append([OP_CALL if kind == 'call' else OP_EXEC, instr, None])
+        previous_if = None
+
+
+class BinarySite:
+    """Type feedback of an x=a+b assignment, which runs specialised once its operand types settle
+
+    While adaptive the assignment runs as a general statement and counts down
+    to a look at its operand types. When both are int, float or str it is
+    specialised, later runs check the types with a guard and apply the
+    operator directly. A guard failure de-optimises it back to adaptive.
+    """
+
+    __slots__ = ('target', 'left_slot', 'left_value', 'right_slot', 'right_value',
+                 'symbol', 'op_func', 'guard', 'counter')
+
+    def __init__(self, target: int, left: str, symbol: str, right: str):
+        self.target = target
+        self.left_slot, self.left_value = self._operand(left)
+        self.right_slot, self.right_value = self._operand(right)
+        self.symbol = symbol
+        self.op_func = SAFE_OPERATIONS[symbol]
+        self.guard: Optional[type] = None  # Operand type while specialised
+        self.counter = QUICKEN_WARMUP
+
+    @staticmethod
+    def _operand(text: str) -> Tuple[Optional[int], Any]:
+        if text[0].isdigit():
+            return None, _number(text)
+        return symbols.slot(text), None
+
+    def observe(self, left: Any, right: Any) -> bool:
+        """Count an adaptive run, returning True when it specialises the site"""
+        self.counter -= 1
+        if self.counter > 0:
+            return False
+        operand_type = type(left)
+        if type(right) is operand_type and self.symbol in SPECIALISED_OPERATORS.get(operand_type, ()):
+            self.guard = operand_type
+            return True
+        self.counter = QUICKEN_BACKOFF
+        return False
+
+    def deoptimize(self):
+        """Go back to adaptive runs after a guard failure"""
+        self.guard = None
+        self.counter = QUICKEN_BACKOFF
+
+    def __repr__(self):
+        if self.guard is None:
+            return 'adaptive'
+        name = self.guard.__name__
+        return f"{name}/{name}"
+
+
+def _number(text: str):
+    return float(text) if '.' in text else int(text)
+
+
+def _fuse(op: List):
+    """Turn an op into a superinstruction when its statement has one of the common shapes"""
+    opcode, instr, arg = op
+    kind = instr.kind
+
+    if kind == 'assign' and opcode == OP_EXEC:
+        # x=x+N and x=x-N
+        match = _INCREMENT.match(instr.operands[1])
+        if match and match.group(1) == instr.operands[0] and instr.target is not None and instr.expr is not None:
+            delta = _number(match.group(3))
+            op[0] = OP_INCREMENT
+            op[2] = (instr.target, -delta if match.group(2) == '-' else delta)
+            return
+
+        # x=a+b with names and numbers, specialised at run time
+        match = _BINARY.match(instr.operands[1])
+        if match and instr.target is not None and instr.expr is not None \
+                and not (match.group(1)[0].isdigit() and match.group(3)[0].isdigit()):
+            op[0] = OP_BINARY
+            op[2] = BinarySite(instr.target, *match.groups())
+
+    elif opcode in (OP_BRANCH, OP_LOOP) and instr.expr is not None:
+        match = _COMPARE.match(instr.operands[0])
+        if match:
+            op[0] = OP_COMPARE_BRANCH if opcode == OP_BRANCH else OP_COMPARE_LOOP
+            op[2] = (arg, symbols.slot(match.group(1)), SAFE_OPERATIONS[match.group(2)],
+                     _number(match.group(3)))
+
+    elif kind == 'print' and opcode == OP_EXEC and instr.operands:
+        # Literals and plain variable names only, anything else needs the evaluator
+        template = []
+        text = ''  # Adjacent literals and the separators between chunks are merged
+        for index, tokens in enumerate(instr.operands):
+            if index:
+                text += ' '
+            for literal, token, parsed in tokens:
+                if literal is not None:
+                    text += literal
+                elif parsed is not None and _PLAIN_VARIABLE.match(token):
+                    if text:
+                        template.append((text, None))
+                        text = ''
+                    template.append((None, symbols.slot(token)))
+                else:
+                    return
+        template.append((text + '\n', None))
+        op[0] = OP_PRINT
+        op[2] = tuple(template)
+
+
+def compile_tree(nodes: List[Any], instrs: List[Instruction], fuse: bool = True) -> CodeBlock:
+    """Compile block tree nodes into a code block with its goto jump table"""
+    ops: List[List] = []
+    lines: Dict[int, int] = {}
+    _compile_nodes(nodes, instrs, ops, lines, fuse)
+
+    for op in ops:
+        instr = op[1]
+        if op[0] == OP_EXEC and instr.kind == 'goto':
+            # Gotos to a line of this code become direct jumps, the rest leave the code when run
+            if instr.operands[1] in lines:
+                op[0] = OP_GOTO
+                op[2] = lines[instr.operands[1]]
+        elif fuse:
+            _fuse(op)
+    return CodeBlock([tuple(op) for op in ops], lines)
+
+
+def compile_block(instrs: List[Instruction], fuse: bool = True) -> CodeBlock:
+    """Compile decoded instructions, resolving if/else/while/def blocks into jumps"""
+    return compile_tree(build_block_tree(instrs), instrs, fuse)
+
+
+def decode_program(lines: List[str], aliases: Optional[Dict[str, str]] = None,
+                   statements: StatementTable = DEFAULT_STATEMENTS) -> List[Instruction]:
+    """Decode every line of a program, resolving aliases in source order"""
+    aliases = dict(aliases) if aliases else {}
+    program = []
+    for line_number, line in enumerate(lines, 1):
+        instr = decode_line(line, line_number, aliases, statements)
+        if instr.kind == 'alias' and instr.operands and instr.operands[1]:
+            aliases[instr.operands[0]] = instr.operands[1]
+        program.append(instr)
+    return program
@@ -1,8 +1,25 @@
 import operator
 import math
 
+from .arrays import NumericArray, array_max, array_min, array_sum, make_array
+
 VERSION = "v2.2.0b2582"
 MAX_LOOP_ITERATIONS = 10000
+GOTO_MAX_JUMPS = 1000  # Goto jumps allowed in one program run, None for no limit
+MAX_CALL_DEPTH = 10000  # Nested Guython function calls allowed, None for no limit
+LOOP_TIME_LIMIT = None  # Seconds a single loop may run, None for no limit
+LOOP_INSTRUCTION_LIMIT = None  # Instructions a single loop may execute, None for no limit
+LOOP_CHECK_INTERVAL = 1024  # Loop iterations between time and instruction budget checks
+QUICKEN_WARMUP = 8  # Runs of a binary assignment before it is specialised for its operand types
+QUICKEN_BACKOFF = 64  # Runs before a mixed-type or de-optimised assignment is tried again
+PARSE_CACHE_SIZE = 1024  # Parsed expressions kept by the evaluator
+OUTPUT_BUFFER_SIZE = 8192  # Characters of program output buffered when not writing to a terminal
+READ_CHUNK_SIZE = 65536  # Bytes read at a time when streaming a file
+MMAP_THRESHOLD = 1 << 20  # Files at least this large are searched through a memory map
+WRITE_POOL_SIZE = 16  # Append handles kept open by write, the least recently used is closed first
+WRITE_BUFFER_SIZE = 65536  # Bytes buffered by each pooled write handle
+WRITE_SYNC = 'none'  # When written files are fsynced: 'none', 'batch' or 'always'
+EXPRESSION_ENGINE = 'compiled'  # 'compiled' closures or the 'tree' walker
 
 SAFE_OPERATIONS = {
     '+': operator.add,
@@ -31,9 +48,13 @@ SAFE_FUNCTIONS = {
     'float': float,
     'str': str,
     'len': len,
-    'max': max,
-    'min': min,
-    'sum': sum,
+    'range': range,
+    'reversed': reversed,
+    'max': array_max,
+    'min': array_min,
+    'sum': array_sum,
+    'array': make_array,
+    'zeros': NumericArray.zeros,
     'sqrt': math.sqrt,
     'sin': math.sin,
     'cos': math.cos,
@@ -41,3 +62,9 @@ SAFE_FUNCTIONS = {
     'pi': math.pi,
     'e': math.e,
 }
+
+# Functions whose names can't be used for variables, a variable named after any other one hides it
+RESERVED_FUNCTIONS = frozenset([
+    'abs', 'round', 'int', 'float', 'str', 'len', 'max', 'min', 'sum',
+    'sqrt', 'sin', 'cos', 'tan', 'pi', 'e',
+])
@@ -1,38 +1,338 @@
 import re
 import ast
-from typing import Any, Dict
+import io
+import tokenize
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
 
+from .arrays import get_item
 from .errors import GuythonRuntimeError, GuythonSecurityError
-from .constants import SAFE_FUNCTIONS, SAFE_OPERATIONS
+from .constants import SAFE_FUNCTIONS, SAFE_OPERATIONS, PARSE_CACHE_SIZE, EXPRESSION_ENGINE
+from .variables import UNSET, Frame, VariableStore, symbols
 from ..packages.GPD import GPD
 
 
+ENGINES = ('compiled', 'tree')
+
+# Map AST operators to our safe operations
+BINARY_OPERATORS = {
+    'Add': '+', 'Sub': '-', 'Mult': '*', 'Div': '/', 'FloorDiv': '//',
+    'Mod': '%', 'Pow': '**', 'Eq': '==', 'NotEq': '!=',
+    'Lt': '<', 'LtE': '<=', 'Gt': '>', 'GtE': '>='
+}
+COMPARE_OPERATORS = {
+    'Eq': '==', 'NotEq': '!=', 'Lt': '<', 'LtE': '<=',
+    'Gt': '>', 'GtE': '>='
+}
+
+
+def parse_source(expr: str) -> ast.AST:
+    """Rewrite Guython call syntax ('name_' becomes 'name()') and power ('^' becomes '**') and parse an expression"""
+    expr = re.sub(r'(\w+)_', r'\1()', expr)
+    if '^' in expr:
+        expr = _power_operators(expr)
+    return ast.parse(expr, mode='eval').body
+
+
+def _power_operators(expr: str) -> str:
+    """Turn ^ operators into ** so they get the precedence and grouping of power, strings are left alone"""
+    lines = expr.splitlines(keepends=True)
+    starts = [0]
+    for line in lines:
+        starts.append(starts[-1] + len(line))
+    try:
+        positions = [starts[token.start[0] - 1] + token.start[1]
+                     for token in tokenize.generate_tokens(io.StringIO(expr).readline)
+                     if token.type == tokenize.OP and token.string == '^']
+    except (tokenize.TokenError, SyntaxError):
+        return expr  # Left for ast.parse to report
+    for position in reversed(positions):
+        expr = f"{expr[:position]}**{expr[position + 1:]}"
+    return expr
+
+
+class ParsedExpression:
+    """An expression parsed once and compiled to closures on first use"""
+
+    __slots__ = ('source', '_node', '_compiled')
+
+    def __init__(self, source: str, node: ast.AST = None):
+        self.source = source
+        self._node = node
+        self._compiled = None
+
+    @property
+    def node(self) -> ast.AST:
+        """Get the parsed tree"""
+        if self._node is None:
+            self._node = parse_source(self.source)
+        return self._node
+
+    def compiled(self) -> Callable[['ExpressionEvaluator'], Any]:
+        """Get the closure that evaluates this expression"""
+        if self._compiled is None:
+            self._compiled = compile_node(self.node)
+        return self._compiled
+
+
+def compile_node(node: ast.AST) -> Callable[['ExpressionEvaluator'], Any]:
+    """Compile an expression tree into nested closures taking the evaluator"""
+    if isinstance(node, ast.Call):
+        func_fn = compile_node(node.func)
+        arg_fns = [compile_node(arg) for arg in node.args]
+        kwarg_fns = [(kw.arg, compile_node(kw.value)) for kw in node.keywords]
+
+        def call(ev):
+            func = func_fn(ev)
+            args = [fn(ev) for fn in arg_fns]
+            kwargs = {name: fn(ev) for name, fn in kwarg_fns}
+            if callable(func):
+                try:
+                    return func(*args, **kwargs)
+                except Exception as e:
+                    raise GuythonRuntimeError(f"Error calling function: {e}")
+            raise GuythonRuntimeError(f"Not callable: {func}")
+        return call
+
+    if isinstance(node, ast.Attribute):
+        value_fn = compile_node(node.value)
+        attr = node.attr
+
+        def attribute(ev):
+            obj = value_fn(ev)
+            if hasattr(obj, attr):
+                return getattr(obj, attr)
+            raise GuythonRuntimeError(f"Attribute not found: {attr}")
+        return attribute
+
+    if isinstance(node, ast.Constant):
+        value = node.value
+        return lambda ev: value
+
+    if isinstance(node, ast.Name):
+        name = node.id
+        slot = symbols.slot(name)  # Resolved once, loads index the store directly
+
+        def load(ev):
+            frame = ev.frame
+            if frame is not None:
+                value = frame.locals.get(slot, UNSET)
+                if value is not UNSET:
+                    return value
+            store = ev.store
+            if store is not None:
+                cells = store.cells
+                if slot < len(cells):
+                    value = cells[slot]
+                    if value is not UNSET:
+                        return value
+            else:
+                variables = ev.variables
+                if name in variables:
+                    return variables[name]
+            functions = ev.functions
+            if name in functions:
+                return functions[name]
+            raise GuythonRuntimeError(f"Undefined variable: {name}")
+        return load
+
+    if isinstance(node, ast.BinOp):
+        left_fn = compile_node(node.left)
+        right_fn = compile_node(node.right)
+        op_name = type(node.op).__name__
+        if op_name not in BINARY_OPERATORS:
+            def unsupported(ev):
+                left_fn(ev)
+                right_fn(ev)
+                raise GuythonRuntimeError(f"Unsupported operation: {op_name}")
+            return unsupported
+
+        op_func = SAFE_OPERATIONS[BINARY_OPERATORS[op_name]]
+        return lambda ev: op_func(left_fn(ev), right_fn(ev))
+
+    if isinstance(node, ast.Compare):
+        left_fn = compile_node(node.left)
+        steps = []
+        for op, comparator in zip(node.ops, node.comparators):
+            op_name = type(op).__name__
+            op_func = SAFE_OPERATIONS[COMPARE_OPERATORS[op_name]] if op_name in COMPARE_OPERATORS else None
+            steps.append((op_name, op_func, compile_node(comparator)))
+
+        if len(steps) == 1 and steps[0][1] is not None:
+            _, op_func, right_fn = steps[0]
+            return lambda ev: op_func(left_fn(ev), right_fn(ev))
+
+        def compare(ev):
+            left = left_fn(ev)
+            result = True
+            for op_name, op_func, right_fn in steps:
+                right = right_fn(ev)
+                if op_func is None:
+                    raise GuythonRuntimeError(f"Unsupported comparison: {op_name}")
+                result = result and op_func(left, right)
+                left = right
+            return result
+        return compare
+
+    if isinstance(node, ast.Subscript):
+        value_fn = compile_node(node.value)
+        index_fn = compile_node(node.slice)
+        return lambda ev: get_item(value_fn(ev), index_fn(ev))
+
+    if isinstance(node, ast.Slice):
+        bound_fns = [None if bound is None else compile_node(bound)
+                     for bound in (node.lower, node.upper, node.step)]
+        return lambda ev: slice(*[None if fn is None else fn(ev) for fn in bound_fns])
+
+    if isinstance(node, ast.List):
+        element_fns = [compile_node(element) for element in node.elts]
+        return lambda ev: [fn(ev) for fn in element_fns]
+
+    node_name = type(node).__name__
+
+    def unsupported_node(ev):
+        raise GuythonRuntimeError(f"Unsupported AST node: {node_name}")
+    return unsupported_node
+
+
+class ParseCache:
+    """Process-wide LRU cache of parsed expressions"""
+
+    def __init__(self, maxsize: int = PARSE_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+
+    def get(self, expr: str) -> ParsedExpression:
+        """Return the parsed expression for expr, parsing it on a miss"""
+        parsed = self._entries.get(expr)
+        if parsed is not None:
+            self.hits += 1
+            self._entries.move_to_end(expr)
+            return parsed
+
+        self.misses += 1
+        parsed = ParsedExpression(expr, parse_source(expr))
+        if self.maxsize > 0:
+            self._entries[expr] = parsed
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return parsed
+
+    def resize(self, maxsize: int):
+        """Change the cache size, evicting the least recently used entries"""
+        if maxsize < 0:
+            raise ValueError("Parse cache size cannot be negative")
+        self.maxsize = maxsize
+        while len(self._entries) > maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop all entries and reset the counters"""
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def info(self) -> Dict[str, int]:
+        """Get cache statistics"""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+        }
+
+
+parse_cache = ParseCache()
+
+
 class ExpressionEvaluator:
     """Safe expression evaluator"""
     
-    def __init__(self, variables: Dict[str, Any], functions: Dict[str, Any]):
+    def __init__(self, variables: Dict[str, Any], functions: Dict[str, Any], engine: str = EXPRESSION_ENGINE):
+        if engine not in ENGINES:
+            raise GuythonRuntimeError(f"Unknown expression engine: {engine}")
         self.variables = variables
         self.functions = functions
-        self.gpd = GPD(self)
+        self.engine = engine
+        self.frame: Optional[Frame] = None  # Innermost running Guython function
+        self._gpd = None
+
+    @property
+    def variables(self) -> Dict[str, Any]:
+        """Variables mapping, either a slot-indexed VariableStore or a plain dict"""
+        return self._variables
+
+    @variables.setter
+    def variables(self, variables: Dict[str, Any]):
+        self._variables = variables
+        # Compiled name loads index the store directly, plain dicts fall back to lookups
+        self.store = variables if isinstance(variables, VariableStore) else None
+
+    def assign(self, slot: int, name: str, value: Any):
+        """Store a variable whose slot was resolved when decoding"""
+        frame = self.frame
+        if frame is not None and slot in frame.locals:
+            # Parameters are local, every other name is written to the globals
+            frame.locals[slot] = value
+            return
+        store = self.store
+        if store is not None:
+            cells = store.cells
+            if slot < len(cells) and cells[slot] is not UNSET:
+                cells[slot] = value
+            else:
+                store.store(slot, value)
+        else:
+            self._variables[name] = value
+
+    def set_variable(self, name: str, value: Any):
+        """Store a variable by name"""
+        self.assign(symbols.slot(name), name, value)
+
+    def lookup(self, name: str) -> Any:
+        """Find a variable in the current frame, then the globals, returning UNSET if missing"""
+        frame = self.frame
+        if frame is not None:
+            slot = symbols.find(name)
+            if slot in frame.locals:
+                return frame.locals[slot]
+        return self._variables.get(name, UNSET)
+
+    @property
+    def gpd(self) -> GPD:
+        """Package manager, created the first time it is needed"""
+        if self._gpd is None:
+            self._gpd = GPD(self)
+        return self._gpd
     
+    @staticmethod
+    def parse(expr: str) -> ParsedExpression:
+        """Rewrite Guython call syntax and parse an expression"""
+        return parse_cache.get(expr)
+
     def evaluate(self, expr: str) -> Any:
         """Handle function calls with arguments"""
         try:
-            expr = re.sub(r'(\w+)_', r'\1()', expr)
-            node = ast.parse(expr, mode='eval')
-            return self._eval_node(node.body)
+            return self._run(self.parse(expr))
         except Exception as e:
             raise GuythonRuntimeError(f"Error evaluating expression: {e}")
-    
-    def _evaluate_ast(self, expr: str) -> Any:
-        """Evaluate expression using AST"""
-        expr = expr.replace('^', '**')
-        
+
+    def evaluate_parsed(self, parsed: ParsedExpression) -> Any:
+        """Evaluate an expression that was parsed ahead of time"""
         try:
-            node = ast.parse(expr, mode='eval')
-            return self._eval_node(node.body)
+            if self.engine == 'compiled':
+                return (parsed._compiled or parsed.compiled())(self)
+            return self._eval_node(parsed.node)
         except Exception as e:
-            raise GuythonRuntimeError(f"Invalid expression: {expr}")
+            raise GuythonRuntimeError(f"Error evaluating expression: {e}")
+
+    def _run(self, parsed: ParsedExpression) -> Any:
+        """Evaluate a parsed expression with the selected engine"""
+        if self.engine == 'compiled':
+            return parsed.compiled()(self)
+        return self._eval_node(parsed.node)
     
     def _eval_node(self, node):
         """Handle function calls with arguments"""
@@ -66,8 +366,9 @@ class ExpressionEvaluator:
         elif isinstance(node, ast.Constant):  # Python < 3.8 compatibility
             return node.s
         elif isinstance(node, ast.Name):
-            if node.id in self.variables:
-                return self.variables[node.id]
+            value = self.lookup(node.id)
+            if value is not UNSET:
+                return value
             elif node.id in self.functions:
                 return self.functions[node.id]
             else:
@@ -85,14 +386,8 @@ class ExpressionEvaluator:
             op_name = type(node.op).__name__
             
             # Map AST operators to our safe operations
-            op_map = {
-                'Add': '+', 'Sub': '-', 'Mult': '*', 'Div': '/', 'FloorDiv': '//',
-                'Mod': '%', 'Pow': '**', 'Eq': '==', 'NotEq': '!=',
-                'Lt': '<', 'LtE': '<=', 'Gt': '>', 'GtE': '>='
-            }
-            
-            if op_name in op_map:
-                op_func = SAFE_OPERATIONS[op_map[op_name]]
+            if op_name in BINARY_OPERATORS:
+                op_func = SAFE_OPERATIONS[BINARY_OPERATORS[op_name]]
                 return op_func(left, right)
             else:
                 raise GuythonRuntimeError(f"Unsupported operation: {op_name}")
@@ -126,5 +421,12 @@ class ExpressionEvaluator:
                 return getattr(obj, node.attr)
             else:
                 raise GuythonRuntimeError(f"Attribute not found: {node.attr}")
+        elif isinstance(node, ast.Subscript):
+            return get_item(self._eval_node(node.value), self._eval_node(node.slice))
+        elif isinstance(node, ast.Slice):
+            return slice(*[None if bound is None else self._eval_node(bound)
+                           for bound in (node.lower, node.upper, node.step)])
+        elif isinstance(node, ast.List):
+            return [self._eval_node(element) for element in node.elts]
         else:
             raise GuythonRuntimeError(f"Unsupported AST node: {type(node).__name__}")
\ No newline at end of file
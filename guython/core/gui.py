@@ -6,6 +6,11 @@ from PIL import Image, ImageTk
 
 from .errors import GuythonRuntimeError
 
+# Statements the interpreter registers for the GUI
+GUI_COMMANDS = (
+    'createWindow', 'createButton', 'createLabel', 'createEntry', 'createImage',
+    'showMessage', 'setWindowColor', 'startGui', 'waitGui',
+)
 
 class GuythonGUI:
     """GUI manager for Guython"""
@@ -87,12 +92,13 @@ class GuythonGUI:
         button.place(x=x, y=y, width=width, height=height)
 
         if command and interpreter:
+            # Decode the command once so every press runs the same instruction
+            instruction = interpreter.decode_line(command)
+
             def callback():
                 try:
                     print(f"BUTTON PRESS: {command}")  # Debug
-                    # Create temporary code to execute
-                    temp_code = f"{command}"
-                    interpreter.run_line(temp_code)
+                    interpreter.run_instruction(instruction)
                 except Exception as e:
                     print(f"BUTTON ERROR: {e}")
             
@@ -1,7 +1,9 @@
 import os
 import re
+import time
+from stat import S_ISREG
 from types import SimpleNamespace
-from typing import Dict, List, Tuple, Any, Optional
+from typing import Callable, Dict, Iterator, List, Tuple, Any, Optional
 import sys
 
 from .errors import (
@@ -9,13 +11,94 @@ from .errors import (
     GuythonSyntaxError,
     GuythonRuntimeError,
     GuythonSecurityError,
-    GuythonGotoException,
+    GuythonJumpLimitError,
 )
-from .constants import VERSION, MAX_LOOP_ITERATIONS, SAFE_FUNCTIONS
-from .evaluator import ExpressionEvaluator
-from .gui import GuythonGUI
+from .constants import (
+    VERSION,
+    MAX_LOOP_ITERATIONS,
+    GOTO_MAX_JUMPS,
+    MAX_CALL_DEPTH,
+    LOOP_TIME_LIMIT,
+    LOOP_INSTRUCTION_LIMIT,
+    LOOP_CHECK_INTERVAL,
+    SAFE_FUNCTIONS,
+)
+from .arrays import set_item
+from .evaluator import ENGINES, ExpressionEvaluator
+from .variables import UNSET, Frame, VariableStore, symbols
+from .compiler import (
+    DEFAULT_STATEMENTS,
+    CodeBlock,
+    Instruction,
+    NO_CONSTANT,
+    OP_BINARY,
+    OP_BRANCH,
+    OP_CALL,
+    OP_COMPARE_BRANCH,
+    OP_COMPARE_LOOP,
+    OP_DEF,
+    OP_EXEC,
+    OP_FOR_ITER,
+    OP_GET_ITER,
+    OP_GOTO,
+    OP_INCREMENT,
+    OP_JUMP,
+    OP_LOOP,
+    OP_PRINT,
+    OP_SETUP_LOOP,
+    STRUCTURAL_KINDS,
+    build_block_tree,
+    compile_block,
+    compile_tree,
+    decode_line,
+    decode_program,
+    is_valid_variable_name,
+    strip_comments,
+)
+from .optimizer import Optimizer
+from .output import OutputSink
+from ..utils.fileio import (
+    CommentStripper,
+    LineFile,
+    WritePool,
+    count_lines_before,
+    grep_lines,
+    has_content,
+    head_lines,
+    iter_lines,
+    range_lines,
+    stream_text,
+    tail_lines,
+)
+from ..utils.tables import csv_writer, json_writer, load_csv, load_json, parse_columns
+from .cache import cache_path, decode_key, load_cached_program, save_cached_program
+from .gui import GUI_COMMANDS, GuythonGUI
 from ..packages.GPD import GPD
 
+# Modifiers of read that pick which lines are read, with their value
+READ_SELECTIONS = {
+    'head': re.compile(r'-head\s+(\d+)'),
+    'tail': re.compile(r'-tail\s+(\d+)'),
+    'range': re.compile(r'-range\s+(\d*:\d*)'),
+    'grep': re.compile(r'-grep\s+(?:"([^"]*)"|\'([^\']*)\'|(\S+))'),
+}
+
+# Modifiers each load statement takes, -columns and -rows are followed by a value
+LOAD_MODIFIERS = {
+    'readlines': (),
+    'loadcsv': ('-header', '-columns', '-rows', '-bycolumn'),
+    'loadjson': ('-columns', '-rows', '-bycolumn'),
+}
+LOAD_VALUES = ('-columns', '-rows')
+LOAD_SYNTAX = {
+    'readlines': "Readlines syntax: {variable} = readlines {filePath} {fileName}.{fileExtension}",
+    'loadcsv': "Loadcsv syntax: {variable} = loadcsv [-header] [-columns a,b] [-rows n] [-bycolumn] "
+               "{filePath} {fileName}.{fileExtension}",
+    'loadjson': "Loadjson syntax: {variable} = loadjson [-columns a,b] [-rows n] [-bycolumn] "
+                "{filePath} {fileName}.{fileExtension}",
+}
+SAVE_HEADER = re.compile(r'-header\s+(?:"([^"]*)"|\'([^\']*)\'|(\S+))')
+
 
 class GuythonInterpreter:
     """Main Guython interpreter class"""
@@ -24,22 +107,74 @@ class GuythonInterpreter:
     import sys
     
     def __init__(self):
-        self.variables: Dict[str, Any] = {}
+        # One evaluator is shared by every expression and owns the variables
+        self.evaluator = ExpressionEvaluator(VariableStore(), SAFE_FUNCTIONS)
         self.functions: Dict[str, List[Tuple[int, str]]] = {}
-        self.loop_stack: List[Tuple[str, int, List[Tuple[int, str]]]] = []
+        self.loop_stack: List[Tuple[Instruction, int, List[Instruction]]] = []
         self.if_stack: List[Tuple[bool, int]] = []
         self.defining_function: Optional[Tuple[str, int]] = None
-        self.function_stack: List[Tuple[int, str]] = []
+        self.function_stack: List[Instruction] = []
         self.current_line_number = 0
         self.debug_mode = False
+        self.use_program_cache = True  # Reuse decoded programs from __gycache__
+        self.optimize = False  # Fold constants and drop dead blocks before running a program
+        self.use_superinstructions = True  # Fuse common statement shapes when compiling
         self.program_lines: List[str] = []
-        self.goto_max_jumps = 1000  # Prevent infinite goto loops
+        self.output = OutputSink()  # Program output, block-buffered when not going to a terminal
+        self.files = WritePool()  # Append handles of write, flushed with the output
+        self.atomic_writes = False  # Replace files by renaming a synced temp file, as with write -atomic
+        self.goto_max_jumps: Optional[int] = GOTO_MAX_JUMPS  # Prevent infinite goto loops
+        self.pending_goto: Optional[int] = None  # Target line of a goto leaving compiled code
+        self._program_depth = 0
+        # Runaway loop protection, each limit applies to a single run of a loop
+        self.max_loop_iterations: Optional[int] = MAX_LOOP_ITERATIONS
+        self.loop_time_limit: Optional[float] = LOOP_TIME_LIMIT
+        self.loop_instruction_limit: Optional[int] = LOOP_INSTRUCTION_LIMIT
+        self.instruction_count = 0  # Instructions run by compiled code
+        self.max_call_depth: Optional[int] = MAX_CALL_DEPTH
+        self.call_depth = 0  # Guython function calls currently running
         self.goto_jump_count = 0
         self.gui = GuythonGUI(interpreter=self)
-        self.gpd = GPD(self)
+        self._gpd: Optional[GPD] = None
         self.functions = {}
         self.aliases = {}
         self.else_stack = []
+
+        # Statement kinds are decoded with this table and dispatched through _handlers
+        self.statements = DEFAULT_STATEMENTS.copy()
+        self._handlers: Dict[str, Callable[[Instruction, bool], Any]] = {
+            'eval': self._handle_eval_command,
+            'input': self._handle_input,
+            'input_assign': self._handle_input_assignment,
+            'load_assign': self._handle_load_assignment,
+            'alias': self._handle_alias,
+            'else': self._handle_else,
+            'exit': self._handle_exit,
+            'gpd': self._handle_gpd_command,
+            'def': self._handle_function_definition,
+            'while': self._handle_while,
+            'for': self._handle_for,
+            'if': self._handle_if,
+            'goto': self._handle_goto,
+            'guython': self._handle_guython_command,
+            'call': self._handle_function_call,
+            'print_input': self._handle_print_input,
+            'assign': self._handle_assignment,
+            'item_assign': self._handle_item_assignment,
+            'print': self._handle_print,
+            'easter_egg': self._handle_easter_egg,
+            'array_access': self._handle_array_access_command,
+            'expr': self._handle_expression,
+        }
+        for command in GUI_COMMANDS:
+            self.register_statement(command, self._handle_gui_command)
+        self.register_statement('readText', self._handle_read_text)
+        self.register_statement('setText', self._handle_set_text)
+        self.register_statement('read', self._handle_read)
+        self.register_statement('write', self._handle_write)
+        self.register_statement('savecsv', self._handle_save)
+        self.register_statement('savejson', self._handle_save)
+        self.register_statement('import', self._handle_import)
         
         # New features
         self.last_output = None  # Store last printed value for '_' variable
@@ -48,159 +183,108 @@ class GuythonInterpreter:
         """Enable or disable debug mode"""
         self.debug_mode = enabled
     
+    def set_program_cache(self, enabled: bool):
+        """Enable or disable the on-disk compiled-program cache"""
+        self.use_program_cache = enabled
+
+    def set_optimize(self, enabled: bool):
+        """Enable or disable the optimizer pass over loaded programs"""
+        self.optimize = enabled
+
+    def set_superinstructions(self, enabled: bool):
+        """Enable or disable fused ops for common statement shapes in newly compiled code"""
+        self.use_superinstructions = enabled
+
+    def set_loop_limits(self, max_iterations: Optional[int] = MAX_LOOP_ITERATIONS,
+                        time_limit: Optional[float] = LOOP_TIME_LIMIT,
+                        max_instructions: Optional[int] = LOOP_INSTRUCTION_LIMIT):
+        """Set the iteration, wall-clock and instruction budgets of a loop, None or 0 disables one"""
+        for name, value in (('iterations', max_iterations), ('time limit', time_limit),
+                            ('instructions', max_instructions)):
+            if value is not None and value < 0:
+                raise GuythonRuntimeError(f"Loop {name} cannot be negative")
+        self.max_loop_iterations = max_iterations or None
+        self.loop_time_limit = time_limit or None
+        self.loop_instruction_limit = max_instructions or None
+
+    def set_goto_limit(self, max_jumps: Optional[int] = GOTO_MAX_JUMPS):
+        """Set how many goto jumps one program run may take, None or 0 for no limit"""
+        if max_jumps is not None and max_jumps < 0:
+            raise GuythonRuntimeError("Goto jump limit cannot be negative")
+        self.goto_max_jumps = max_jumps or None
+
+    def set_recursion_limit(self, max_depth: Optional[int] = MAX_CALL_DEPTH):
+        """Set how deeply Guython function calls may nest, None or 0 for no limit"""
+        if max_depth is not None and max_depth < 0:
+            raise GuythonRuntimeError("Recursion limit cannot be negative")
+        self.max_call_depth = max_depth or None
+
+    def set_output(self, target=None):
+        """Send program output to stdout (None), a file path or a writable stream such as io.StringIO"""
+        self.output.redirect(target)
+
+    def set_write_pool(self, max_handles: Optional[int] = None, buffer_size: Optional[int] = None,
+                       sync: Optional[str] = None):
+        """Set how many files write keeps open, their buffer size and the 'none', 'batch' or 'always' fsync mode"""
+        self.files.configure(max_handles, buffer_size, sync)
+
+    def set_atomic_writes(self, enabled: bool):
+        """Make every overwriting write atomic, as if it had the -atomic modifier"""
+        self.atomic_writes = enabled
+
+    def flush_output(self):
+        """Write out any buffered program output and file writes"""
+        self.output.flush()
+        self.files.flush()
+
+    def set_expression_engine(self, engine: str):
+        """Select the 'compiled' or 'tree' expression engine"""
+        if engine not in ENGINES:
+            raise GuythonRuntimeError(f"Unknown expression engine: {engine}")
+        self.evaluator.engine = engine
+
+    @property
+    def variables(self) -> Dict[str, Any]:
+        """Live variables mapping, shared with the evaluator"""
+        return self.evaluator.variables
+
+    @variables.setter
+    def variables(self, variables: Dict[str, Any]):
+        self.evaluator.variables = variables
+
+    @property
+    def gpd(self) -> GPD:
+        """Package manager, created the first time a package command needs it"""
+        if self._gpd is None:
+            self._gpd = GPD(self)
+        return self._gpd
+
     def _debug_print(self, message: str):
         """Print debug message if debug mode is enabled"""
         if self.debug_mode:
+            self.output.flush()
             print(f"[DEBUG] {message}")
     
-    def _strip_comments(self, line: str) -> str:
-        """Remove comments from a line"""
-        result = ''
-        i = 0
-        while i < len(line):
-            if line[i] == '{':
-                end = line.find('}', i + 1)
-                if end != -1:
-                    i = end + 1
-                else:
-                    break
-            else:
-                result += line[i]
-                i += 1
-        return result.strip()
-    
     def _validate_variable_name(self, name: str) -> bool:
         """Validate variable name"""
-        if not re.match(r'^[A-Za-z_][A-Za-z0-9_]*$', name):
-            return False
-        if name in SAFE_FUNCTIONS or name in ['import', 'print', 'if', 'while', 'def', 'goto', 'eval']:
-            return False
-        return True
-    
-    def _get_indent_level(self, line: str) -> Tuple[int, str]:
-        """Get indentation level and code"""
-        indent = 0
-        while indent < len(line) and line[indent] == '.':
-            indent += 1
-        return indent, line[indent:]
-    
-    def _parse_array_literal(self, expr: str) -> List[Any]:
-        """Parse array literal like [1,2,3] or ['a','b','c']"""
-        if not (expr.startswith('[') and expr.endswith(']')):
-            raise GuythonSyntaxError("Invalid array syntax")
-        
-        content = expr[1:-1].strip()
-        if not content:
-            return []
-        
-        # Split by commas, respecting quotes
-        elements = self._split_outside_quotes(content, ',')
-        result = []
-        evaluator = ExpressionEvaluator(self.variables, SAFE_FUNCTIONS)
-        
-        for element in elements:
-            element = element.strip()
-            if element:
-                try:
-                    value = evaluator.evaluate(element)
-                    result.append(value)
-                except Exception as e:
-                    raise GuythonRuntimeError(f"Error evaluating array element '{element}': {e}")
-        
-        return result
-    
-    def _handle_array_access(self, code: str) -> Any:
-        """Handle array access like x[0] or nested like x[0][1]"""
-        # Find the variable name and indices
-        bracket_start = code.find('[')
-        if bracket_start == -1:
-            raise GuythonSyntaxError("Invalid array access syntax")
-        
-        var_name = code[:bracket_start].strip()
-        if var_name not in self.variables:
-            raise GuythonRuntimeError(f"Variable '{var_name}' not found")
-        
-        current_value = self.variables[var_name]
-        remaining = code[bracket_start:]
-        
-        # Parse all bracket accesses
-        evaluator = ExpressionEvaluator(self.variables, SAFE_FUNCTIONS)
-        while remaining.startswith('['):
-            end_bracket = remaining.find(']')
-            if end_bracket == -1:
-                raise GuythonSyntaxError("Missing closing bracket")
-            
-            index_expr = remaining[1:end_bracket]
-            try:
-                index = evaluator.evaluate(index_expr)
-                if not isinstance(index, int):
-                    raise GuythonRuntimeError(f"Array index must be integer, got {type(index).__name__}")
-                
-                if not isinstance(current_value, list):
-                    raise GuythonRuntimeError(f"Cannot index non-array value of type {type(current_value).__name__}")
-                
-                if index < 0 or index >= len(current_value):
-                    raise GuythonRuntimeError(f"Array index {index} out of bounds (0-{len(current_value)-1})")
-                
-                current_value = current_value[index]
-                remaining = remaining[end_bracket + 1:]
-                
-            except GuythonError:
-                raise
-            except Exception as e:
-                raise GuythonRuntimeError(f"Error accessing array index: {e}")
-        
-        return current_value
-    
-    def _handle_array_assignment(self, var_part: str, value: Any):
-        """Handle array element assignment like x[0] = 5"""
-        bracket_start = var_part.find('[')
-        if bracket_start == -1:
-            raise GuythonSyntaxError("Invalid array assignment syntax")
-        
-        var_name = var_part[:bracket_start].strip()
-        if var_name not in self.variables:
-            raise GuythonRuntimeError(f"Variable '{var_name}' not found")
-        
-        if not isinstance(self.variables[var_name], list):
-            raise GuythonRuntimeError(f"Cannot assign to index of non-array variable '{var_name}'")
-        
-        # For simplicity, only handle single-level indexing for assignment
-        bracket_end = var_part.find(']')
-        if bracket_end == -1:
-            raise GuythonSyntaxError("Missing closing bracket")
-        
-        index_expr = var_part[bracket_start + 1:bracket_end]
-        try:
-            evaluator = ExpressionEvaluator(self.variables, SAFE_FUNCTIONS)
-            index = evaluator.evaluate(index_expr)
-            
-            if not isinstance(index, int):
-                raise GuythonRuntimeError(f"Array index must be integer, got {type(index).__name__}")
-            
-            array = self.variables[var_name]
-            if index < 0 or index >= len(array):
-                raise GuythonRuntimeError(f"Array index {index} out of bounds (0-{len(array)-1})")
-            
-            array[index] = value
-            self._debug_print(f"Set {var_name}[{index}] = {value}")
-            
-        except GuythonError:
-            raise
-        except Exception as e:
-            raise GuythonRuntimeError(f"Error in array assignment: {e}")
+        return is_valid_variable_name(name)
     
-    def _handle_eval_command(self, code: str, importing: bool):
+    def _evaluate(self, source: str, node: Any = None) -> Any:
+        """Evaluate an expression, using its pre-parsed tree when available"""
+        if node is not None:
+            return self.evaluator.evaluate_parsed(node)
+        return self.evaluator.evaluate(source)
+
+    def _handle_eval_command(self, instr: Instruction, importing: bool):
         """Handle eval command to execute Guython code from string"""
         if importing:
             return
         
-        # Extract the expression to evaluate
-        expr = code[4:].strip()  # Remove 'eval' prefix
+        # The expression to evaluate follows the 'eval' prefix
+        expr = instr.operands[0]
         
         try:
-            evaluator = ExpressionEvaluator(self.variables, SAFE_FUNCTIONS)
-            code_to_execute = evaluator.evaluate(expr)
+            code_to_execute = self._evaluate(expr, instr.expr)
             
             if not isinstance(code_to_execute, str):
                 raise GuythonRuntimeError(f"Eval requires string argument, got {type(code_to_execute).__name__}")
@@ -218,206 +302,224 @@ class GuythonInterpreter:
     def run_program(self, lines: List[str]):
         """Run a complete program with goto support"""
         self.program_lines = lines
+        self.execute_program(decode_program(lines, self.aliases, self.statements))
+
+    def run_file(self, filename: str):
+        """Run a Guython file, using the compiled-program cache when enabled"""
+        self.execute_program(self.load_program(filename))
+
+    def load_program(self, filename: str) -> List[Instruction]:
+        """Decode a Guython file, reusing its .gyc cache entry when it is current"""
+        key = decode_key(self.aliases, self.statements)
+        if self.use_program_cache:
+            program = load_cached_program(filename, key)
+            if program is not None:
+                self._debug_print(f"Loaded compiled program: {cache_path(filename)}")
+                return program
+
+        with open(filename, 'r') as f:
+            program = decode_program(f.readlines(), self.aliases, self.statements)
+
+        if self.use_program_cache:
+            save_cached_program(filename, key, program)
+        return program
+
+    def execute_program(self, program: List[Instruction]):
+        """Execute a decoded program, compiled into a block tree of jumps, with goto support"""
         self.goto_jump_count = 0
-        
-        line_number = 0
-        while line_number < len(lines):
-            try:
-                self.run_line(lines[line_number], line_number=line_number + 1)
-                line_number += 1
-            except GuythonGotoException as goto_ex:
-                # Handle goto jump
-                target_line = goto_ex.target_line
-                if target_line < 1 or target_line > len(lines):
-                    raise GuythonRuntimeError(f"Goto target line {target_line} is out of range (1-{len(lines)})")
-                
-                self.goto_jump_count += 1
-                if self.goto_jump_count > self.goto_max_jumps:
-                    raise GuythonRuntimeError(f"Maximum goto jumps exceeded ({self.goto_max_jumps}). Possible infinite loop.")
-                
-                line_number = target_line - 1  # Convert to 0-based index
-                self._debug_print(f"Goto jump to line {target_line}")
-        
-        # Execute any remaining loops
-        self.execute_remaining_loops()
+        self.pending_goto = None
+        self._program_depth += 1
+
+        try:
+            code = self._compile_program(program)
+            pc = 0
+            while True:
+                pc = self._run_code(code, start=pc, resumable=True)
+
+                if self.pending_goto is not None:
+                    # Every line outside function bodies is in the program's jump table
+                    target_line = self.pending_goto
+                    self.pending_goto = None
+                    if 1 <= target_line <= len(program):
+                        raise GuythonRuntimeError(f"Goto target line {target_line} is inside a function body")
+                    raise GuythonRuntimeError(f"Goto target line {target_line} is out of range (1-{len(program)})")
+
+                if pc is None:
+                    break
+
+                # A package registered new statements, decode the rest again and resume
+                line_number = code.ops[pc - 1][1].line_number
+                resume_line = code.ops[pc][1].line_number if pc < len(code.ops) else None
+                sources = [instr.source for instr in program]
+                program[line_number:] = decode_program(sources, self.aliases, self.statements)[line_number:]
+                code = self._compile_program(program)
+                if resume_line is None:
+                    break
+                pc = code.lines[resume_line]
+        finally:
+            self._program_depth -= 1
+            self.pending_goto = None
+            if not self._program_depth:
+                self.output.flush()
+                self.files.close()
+
+    def _compile_program(self, program: List[Instruction]) -> CodeBlock:
+        """Compile a whole program, running the optimizer over its block tree when enabled"""
+        tree = build_block_tree(program)
+        if not self.optimize:
+            return compile_tree(tree, program, self.use_superinstructions)
+
+        optimizer = Optimizer(program)
+        code = compile_tree(optimizer.optimize(tree), program, self.use_superinstructions)
+        if self.debug_mode:
+            notes = ''.join(f"{note}\n" for note in optimizer.notes)
+            self._debug_print(f"Optimized program ({optimizer.summary()}):\n{notes}{code.dump()}")
+        return code
+
+    def _count_goto(self, target_line: int):
+        """Count a goto jump against the jump budget of the run"""
+        self.goto_jump_count += 1
+        if self.goto_max_jumps is not None and self.goto_jump_count > self.goto_max_jumps:
+            raise GuythonJumpLimitError(f"Maximum goto jumps exceeded ({self.goto_max_jumps}). Possible infinite loop.")
+        if self.debug_mode:
+            self._debug_print(f"Goto jump to line {target_line}")
     
+    def decode_line(self, line: str, line_number: int = 0) -> Instruction:
+        """Decode a single line using the current aliases"""
+        return decode_line(line, line_number, self.aliases, self.statements)
+
     def run_line(self, line: str, importing: bool = False, line_number: int = 0):
         """Execute a single line of Guython code"""
-        line = line.rstrip("\n")
-        original_line = line  # Keep original for debugging
-        line = self._strip_comments(line)
-        self.current_line_number = line_number
+        self.run_instruction(self.decode_line(line, line_number), importing)
+
+    def run_instruction(self, instr: Instruction, importing: bool = False):
+        """Execute a decoded instruction"""
+        self.current_line_number = instr.line_number
 
-        if not line.strip():
+        if instr.kind == 'empty':
             return
 
         try:
-            indent, code = self._get_indent_level(line)
-            #print(f"DEBUG: Line {line_number}: indent={indent}, code='{code}', defining_function={self.defining_function}")
-
             # Handle function definition body collection FIRST
             if self.defining_function:
                 func_name, func_indent = self.defining_function
-                #print(f"DEBUG: In function definition mode for '{func_name}', func_indent={func_indent}, current_indent={indent}")
 
-                if indent > func_indent:
+                if instr.indent > func_indent:
                     # This line is part of the function body
-                    self.function_stack.append((indent, code))
-                    #print(f"DEBUG: Added to function body: ({indent}, '{code}')")
+                    self.function_stack.append(instr)
                     return
                 else:
                     # Function definition is complete
-                    self.functions[func_name]['body'] = self.function_stack.copy()
-                    #print(f"DEBUG: Function '{func_name}' body complete: {self.function_stack}")
-                    self.defining_function = None
-                    self.function_stack = []
+                    self._finish_function_definition()
                     # IMPORTANT: Continue processing the current line normally
                     # Don't return here - let it fall through to _process_command
 
             # Close blocks based on indentation
-            self._close_blocks(indent)
+            self._close_blocks(instr.indent)
+            if self.pending_goto is not None:
+                # A goto in a closed loop leaves before this line runs
+                return
 
             # Process the command
-            self._process_command(code, indent, importing)
+            self._process_command(instr, importing)
 
-        except GuythonGotoException:
-            # Re-raise goto exceptions to be handled by run_program
+        except GuythonJumpLimitError:
+            # Running out of goto jumps stops the program
             raise
         except GuythonError as e:
             if not importing:
-                stripped_line = original_line.rstrip('\n')
-                first_char_index = len(stripped_line) - len(stripped_line.lstrip(' '))
-                print(f"[Line {line_number}] {stripped_line}")
-                print(" " * (len(f"[Line {line_number}] ") + first_char_index) + "^")
-                print(f"GuythonError: {e}")
+                self._report_error(instr, f"GuythonError: {e}")
         except Exception as e:
             if not importing:
-                stripped_line = original_line.rstrip('\n')
-                first_char_index = len(stripped_line) - len(stripped_line.lstrip(' '))
-                print(f"[Line {line_number}] {stripped_line}")
-                print(" " * (len(f"[Line {line_number}] ") + first_char_index) + "^")
-                print(f"Unexpected error: {e}")
-
-    def _process_command(self, code: str, indent: int, importing: bool):
-        """Process a single command"""
-        #print(f"DEBUG: _process_command called with code='{code}'")
-        #print(f"DEBUG: code.endswith('_') = {code.endswith('_')}")
-        #print(f"DEBUG: code ends with: '{code[-5:]}' (last 5 chars)")
-
-        # Apply aliases
-        for alias, replacement in self.aliases.items():
-            if code.startswith(alias + " "):
-                code = code.replace(alias, replacement, 1)
-
-        # Handle eval command
-        if code.startswith('eval '):
-            #print("DEBUG: Handling eval command")
-            self._handle_eval_command(code, importing)
+                self._report_error(instr, f"Unexpected error: {e}")
+
+    def _report_error(self, instr: Instruction, message: str):
+        """Print an error with a caret under the offending line"""
+        stripped_line = instr.source
+        first_char_index = len(stripped_line) - len(stripped_line.lstrip(' '))
+        self.flush_output()  # Errors come after the output and writes that led up to them
+        print(f"[Line {instr.line_number}] {stripped_line}")
+        print(" " * (len(f"[Line {instr.line_number}] ") + first_char_index) + "^")
+        print(message)
+
+    def _process_command(self, instr: Instruction, importing: bool):
+        """Process a single decoded command"""
+        kind = instr.kind
+        indent = instr.indent
+
+        # Loop bodies are collected whole and compiled when the loop closes
+        if self.loop_stack and indent > self.loop_stack[-1][1]:
+            self.loop_stack[-1][2].append(instr)
             return
 
-        if code.startswith('input"') and code.endswith('"'):
-            #print("DEBUG: Handling input with double quotes")
-            return self._handle_input(code, importing)
-        elif code.startswith("input'") and code.endswith("'"):
-            #print("DEBUG: Handling input with single quotes")
-            return self._handle_input(code, importing)
-        elif '=input"' in code and code.count('"') == 2:
-            #print("DEBUG: Handling input assignment with double quotes")
-            return self._handle_input_assignment(code, importing)
-        elif "=input '" in code and code.count("'") == 2:
-            #print("DEBUG: Handling input assignment with single quotes")
-            return self._handle_input_assignment(code, importing)
-        elif code.startswith("alias "):
-            #print("DEBUG: Handling alias")
-            self._handle_alias(code)
-        elif code.startswith("else"):
-            #print("DEBUG: Handling else")
-            self._handle_else(indent)
-        elif code.startswith("exit_"):
-            #print("DEBUG: Handling exit")
-            self.os._exit(0)
-            self.sys.exit(0)
-        elif code.startswith("gpd "):
-            #print("DEBUG: Handling gpd command")
-            self._handle_gpd_command(code[4:])
-        elif code.startswith('def'):
-            #print("DEBUG: Handling function definition")
-            self._handle_function_definition(code, indent, importing)
-        elif code.startswith('while'):
-            #print("DEBUG: Handling while loop")
-            self._handle_while(code, indent, importing)
-        elif code.startswith('if'):
-            #print("DEBUG: Handling if statement")
-            self._handle_if(code, indent, importing)
-        elif self.loop_stack and indent > self.loop_stack[-1][1]:
-            #print("DEBUG: Adding to loop block")
-            self.loop_stack[-1][2].append((indent, code))
-        elif self.if_stack and not self.if_stack[-1][0] and indent > self.if_stack[-1][1]:
-            #print("DEBUG: Skipping line due to false if condition")
-            self._debug_print(f"Skipping line due to false if condition: {code}")
-            return
-        elif code.startswith('goto'):
-            #print("DEBUG: Handling goto")
-            self._handle_goto(code, importing)
-            return
-        elif code.startswith("guython"):
-            #print("DEBUG: Handling guython command")
-            self._handle_guython_command(code, importing)
-            return
-        # Check for function call pattern: word_ [args] or just word_
-        elif ('_ ' in code or code.endswith('_')) and not any(code.startswith(cmd) for cmd in ['def', 'while', 'if', 'print', 'input', 'alias', 'else', 'exit', 'gpd', 'goto', 'guython', 'read', 'write', 'import']):
-            #print(f"DEBUG: FOUND FUNCTION CALL! code='{code}'")
-            self._handle_function_call(code, importing)
+        # Block structure commands run before if skipping
+        if kind not in STRUCTURAL_KINDS:
+            if self.if_stack and not self.if_stack[-1][0] and indent > self.if_stack[-1][1]:
+                self._debug_print(f"Skipping line due to false if condition: {instr.code}")
+                return
+
+        return self._handlers[kind](instr, importing)
+
+    def register_statement(self, word: str, handler: Callable[[Instruction, bool], Any]):
+        """Register a whole-word statement run as handler(instr, importing)"""
+        if word in self._handlers and word not in self.statements.words:
+            raise GuythonSyntaxError(f"Cannot override built-in statement: {word}")
+        try:
+            self.statements.register(word)
+        except ValueError as e:
+            raise GuythonSyntaxError(str(e))
+        self._handlers[word] = handler
+        self._debug_print(f"Registered statement: {word}")
+
+    def _handle_exit(self, instr: Instruction, importing: bool):
+        """Handle exit_ command"""
+        self.output.flush()
+        self.files.close()
+        self.os._exit(0)
+        self.sys.exit(0)
+
+    def _handle_easter_egg(self, instr: Instruction, importing: bool):
+        """Handle the hidden answers"""
+        if importing:
             return
-        elif code.startswith('printinput') or code.startswith('print input'):
-            #print("DEBUG: Handling print input")
-            self._handle_print_input(importing)
-        elif '=' in code and not code.startswith('print') and code != "5+5=4":
-            #print("DEBUG: Handling assignment")
-            self._handle_assignment(code, importing)
-        elif code.startswith('print'):
-            #print("DEBUG: Handling print statement")
-            self._handle_print(code, importing)
-        elif code == "5+5=4":
-            #print("DEBUG: Handling 5+5=4 easter egg")
-            if not importing:
-                print("chatgpt actually said this bruh 😭")
-        elif code == "9+10":
-            #print("DEBUG: Handling 9+10 easter egg")
-            if not importing:
-                print("21")
-                print("you stupid")
-                print("its 19")
-        elif code == "ver" and "=" not in code:
-            #print("DEBUG: Handling version command")
-            if not importing:
-                print("Guython", VERSION)
-        elif '[' in code and ']' in code and '=' not in code:
-            #print("DEBUG: Handling array access")
-            if not importing:
-                try:
-                    result = self._handle_array_access(code)
-                    if result is not None:
-                        print(result)
-                        self.last_output = result
-                except GuythonError:
-                    raise
+        if instr.code == "5+5=4":
+            self.output.print("chatgpt actually said this bruh 😭")
+        elif instr.code == "9+10":
+            self.output.print("21")
+            self.output.print("you stupid")
+            self.output.print("its 19")
         else:
-            #print("DEBUG: Falling back to expression evaluation")
-            if not importing:
-                try:
-                    evaluator = ExpressionEvaluator(self.variables, SAFE_FUNCTIONS)
-                    result = evaluator.evaluate(code)
-                    if result is not None:
-                        print(result)
-                        self.last_output = result
-                except GuythonError:
-                    raise
-                except Exception as e:
-                    raise GuythonRuntimeError(f"Error evaluating expression: {e}")
+            self.output.print("Guython", VERSION)
+
+    def _handle_array_access_command(self, instr: Instruction, importing: bool):
+        """Print the value of an array access like x[0]"""
+        if not importing:
+            try:
+                result = self._evaluate(instr.code, instr.expr)
+            except GuythonError:
+                raise
+            except Exception as e:
+                raise GuythonRuntimeError(f"Error accessing array index: {e}")
+            if result is not None:
+                self.output.print(result)
+                self.last_output = result
+
+    def _handle_expression(self, instr: Instruction, importing: bool):
+        """Fall back to expression evaluation"""
+        if not importing:
+            try:
+                result = self._evaluate(instr.code, instr.expr)
+                if result is not None:
+                    self.output.print(result)
+                    self.last_output = result
+            except GuythonError:
+                raise
+            except Exception as e:
+                raise GuythonRuntimeError(f"Error evaluating expression: {e}")
     
-    def _handle_gpd_command(self, command: str):
+    def _handle_gpd_command(self, instr: Instruction, importing: bool):
         """Handle GPD package commands"""
+        command = instr.code[4:]
         parts = command.split(maxsplit=1)
         if not parts:
             raise GuythonSyntaxError("Invalid GPD command")
@@ -443,9 +545,9 @@ class GuythonInterpreter:
                     raise GuythonSyntaxError("Invalid import syntax. Use: gpd import <package> [as <alias>]")
 
             elif cmd == "list":
-                print("Installed packages:")
+                self.output.print("Installed packages:")
                 for pkg in self.gpd.list_packages():
-                    print(f"- {pkg} v{self.gpd.package_index[pkg]['version']}")
+                    self.output.print(f"- {pkg} v{self.gpd.package_index[pkg]['version']}")
 
             elif cmd == "uninstall":
                 if not args:
@@ -455,15 +557,15 @@ class GuythonInterpreter:
             elif cmd == "pkgs":
                 try:
                     remote_index = self.gpd._fetch_remote_index()
-                    print("Available packages fetched from repository:")
+                    self.output.print("Available packages fetched from repository:")
                     max_name_len = max(len(pkg) for pkg in remote_index.keys()) if remote_index else 0
 
                     for pkg, data in remote_index.items():
                         version = data.get('version', '?.?.?')
                         description = data.get('description', 'No description available')
-                        print(f"- {pkg.ljust(max_name_len)} (v{version}): {description}")
+                        self.output.print(f"- {pkg.ljust(max_name_len)} (v{version}): {description}")
                 except Exception as e:
-                    print(f"Error fetching remote packages: {e}")
+                    self.output.print(f"Error fetching remote packages: {e}")
 
             elif cmd == "check":
                 self.gpd.check_updates()
@@ -474,8 +576,8 @@ class GuythonInterpreter:
                 self.gpd.update_package(args.strip('"\''))
 
             elif cmd == "help":
-                print("Available GPD commands:")
-                print("""
+                self.output.print("Available GPD commands:")
+                self.output.print("""
 pkgs             - fetch all packages available for download
 list             - list all installed packages
 install {name}   - install package with that name
@@ -489,30 +591,25 @@ update {name}    - update the specified package to latest version
                 raise GuythonSyntaxError(f"Unknown GPD command: '{cmd}', use 'gpd help' to list all GPD commands")
 
         except GuythonRuntimeError as e:
-            print(f"GPD Error: {e}")
+            self.output.print(f"GPD Error: {e}")
         except Exception as e:
-            print(f"Unexpected error: {str(e)}")
+            self.output.print(f"Unexpected error: {str(e)}")
 
     
-    def _handle_goto(self, code: str, importing: bool):
+    def _handle_goto(self, instr: Instruction, importing: bool):
         """Handle goto statement"""
-        # Extract line number from goto command
-        # Handle both "goto 5" and "goto5" syntax
-        if code.startswith('goto '):
-            line_str = code[5:].strip()
-        elif code.startswith('goto'):
-            line_str = code[4:].strip()
-        else:
-            raise GuythonSyntaxError("Invalid goto syntax")
+        # Both "goto 5" and "goto5" are resolved to the line number when decoding
+        target_line = instr.operands[1]
 
-        if not line_str or not line_str.isdigit():
+        if target_line is None:
             raise GuythonSyntaxError("Goto syntax error. Use: goto<line_number> or goto <line_number> (e.g., goto5 or goto 5)")
+        if not self._program_depth:
+            raise GuythonRuntimeError("Goto can only be used while running a program")
 
-        target_line = int(line_str)
         self._debug_print(f"Goto statement: jumping to line {target_line}")
 
-        # Raise exception to trigger jump in run_program
-        raise GuythonGotoException(target_line)
+        # The running program, or the compiled code containing the target, takes the jump
+        self.pending_goto = target_line
 
     def _parse_gui_args(self, code: str) -> List[str]:
         """Parse GUI command arguments, respecting quoted strings"""
@@ -549,11 +646,13 @@ update {name}    - update the specified package to latest version
     
         return args
 
-    def _handle_gui_command(self, code: str, importing: bool):
+    def _handle_gui_command(self, instr: Instruction, importing: bool):
         """Handle GUI-related commands"""
         if importing:
             return
 
+        code = instr.code
+
         # Parse arguments properly
         args = self._parse_gui_args(code)
         if not args:
@@ -577,7 +676,7 @@ update {name}    - update the specified package to latest version
                     resizable = args[4].lower() == "true"
 
                 window_id = self.gui.create_window(title, width, height, resizable)
-                print(f"Created window: {window_id}")
+                self.output.print(f"Created window: {window_id}")
 
             elif command == "createButton":
                 # Syntax: createButton "text" x y width height [command]
@@ -596,7 +695,7 @@ update {name}    - update the specified package to latest version
                     command_func = args[6]
 
                 widget_id = self.gui.create_button(text, x, y, width, height, command_func, self)
-                print(f"Created button: {widget_id}")
+                self.output.print(f"Created button: {widget_id}")
 
             elif command == "createLabel":
                 # Syntax: createLabel "text" x y width height
@@ -612,7 +711,7 @@ update {name}    - update the specified package to latest version
                     height = int(args[5])
 
                 widget_id = self.gui.create_label(text, x, y, width, height)
-                print(f"Created label: {widget_id}")
+                self.output.print(f"Created label: {widget_id}")
 
             elif command == "createEntry":
                 # Syntax: createEntry x y width height ["placeholder"]
@@ -628,7 +727,7 @@ update {name}    - update the specified package to latest version
                     placeholder = args[5].strip('"\'')
 
                 widget_id = self.gui.create_entry(x, y, width, height, placeholder)
-                print(f"Created entry: {widget_id}")
+                self.output.print(f"Created entry: {widget_id}")
 
             elif command == "createImage":
                 # Syntax: createImage "path" x y [width height]
@@ -642,7 +741,7 @@ update {name}    - update the specified package to latest version
                 height = int(args[5]) if len(args) >= 6 else None
 
                 widget_id = self.gui.create_image(path, x, y, width, height)
-                print(f"Created image: {widget_id}")
+                self.output.print(f"Created image: {widget_id}")
 
             elif command == "showMessage":
                 # Syntax: showMessage "title" "message" [type]
@@ -668,9 +767,10 @@ update {name}    - update the specified package to latest version
 
             elif command == "startGui":
                 self.gui.start_gui()
-                print("GUI started")
+                self.output.print("GUI started")
 
             elif command == "waitGui":
+                self.flush_output()
                 self.gui.wait_gui()
                 
 
@@ -682,11 +782,13 @@ update {name}    - update the specified package to latest version
         except Exception as e:
             raise GuythonRuntimeError(f"GUI error in {command}: {e}")
 
-    def _handle_set_text(self, code: str, importing: bool):
+    def _handle_set_text(self, instr: Instruction, importing: bool):
         """Handle setText command to set text of GUI widgets"""
         if importing:
             return
 
+        code = instr.code
+
         # Parse the command properly
         parts = code.split(maxsplit=2)
         if len(parts) < 3:
@@ -704,8 +806,7 @@ update {name}    - update the specified package to latest version
                (text_source.startswith("'") and text_source.endswith("'")):
                 text_value = text_source[1:-1]
             else:
-                evaluator = ExpressionEvaluator(self.variables, SAFE_FUNCTIONS)
-                text_value = str(evaluator.evaluate(text_source))
+                text_value = str(self.evaluator.evaluate(text_source))
         except Exception as e:
             raise GuythonRuntimeError(f"Error evaluating text: {e}")
 
@@ -720,11 +821,13 @@ update {name}    - update the specified package to latest version
         except Exception as e:
             raise GuythonRuntimeError(f"Error setting widget text: {e}")
 
-    def _handle_read_text(self, code: str, importing: bool):
+    def _handle_read_text(self, instr: Instruction, importing: bool):
         """Handle readText command to get text from GUI widgets"""
         if importing:
             return
 
+        code = instr.code
+
         # Parse: readText widgetId variableName
         parts = self._parse_gui_args(code)
         if len(parts) != 3:
@@ -743,22 +846,56 @@ update {name}    - update the specified package to latest version
             # Try to convert to number if possible
             try:
                 if text_value.replace('.', '', 1).isdigit():
-                    self.variables[var_name] = float(text_value)
+                    value = float(text_value)
                 elif text_value.lstrip('-').isdigit():
-                    self.variables[var_name] = int(text_value)
+                    value = int(text_value)
                 else:
                     # Keep as string if not a number
-                    self.variables[var_name] = text_value
+                    value = text_value
             except (ValueError, AttributeError):
                 # Keep as string if conversion fails or if text_value is None
-                self.variables[var_name] = text_value if text_value is not None else ""
+                value = text_value if text_value is not None else ""
 
-            self._debug_print(f"Read text from {widget_id} into {var_name}: {self.variables[var_name]}")
+            self.evaluator.set_variable(var_name, value)
+            self._debug_print(f"Read text from {widget_id} into {var_name}: {value}")
         except Exception as e:
             raise GuythonRuntimeError(f"Error reading from widget {widget_id}: {e}")
     
-    def _handle_function_definition(self, code: str, indent: int, importing: bool):
+    def _handle_function_definition(self, instr: Instruction, importing: bool):
         """Store function name, args, and prepare to capture function body"""
+        func_name, args = self._parse_function_definition(instr)
+
+        # Store function with an empty body until the body has been captured
+        self._define_function(func_name, args, [])
+
+        self.defining_function = (func_name, instr.indent)
+        self.function_stack = []  # Reset function stack
+        #if not importing:
+            #print(f"DEFINED: {func_name} with args {args}")
+
+    def _finish_function_definition(self):
+        """Compile the captured body of the function being defined"""
+        func_name, _ = self.defining_function
+        body = self.function_stack.copy()
+        func = self.functions[func_name]
+        func['body'] = body
+        func['code'] = compile_block(body, self.use_superinstructions)
+        self.defining_function = None
+        self.function_stack = []
+
+    def _define_function(self, func_name: str, args: List[str], body: List[Instruction],
+                         code: Optional[CodeBlock] = None):
+        """Store a function as dict with args, their slots, body and compiled body"""
+        self.functions[func_name] = {
+            'args': args,
+            'slots': [symbols.slot(arg) for arg in args],
+            'body': body,
+            'code': code if code is not None else compile_block(body, self.use_superinstructions),
+        }
+
+    def _parse_function_definition(self, instr: Instruction) -> Tuple[str, List[str]]:
+        """Get the name and argument names of a function definition"""
+        code = instr.code
         #print(f"DEBUG: Handling function definition: {code}")
 
         # Must start with 'def' and have an underscore separating name and args
@@ -791,61 +928,43 @@ update {name}    - update the specified package to latest version
             if arg and not self._validate_variable_name(arg):
                 raise GuythonSyntaxError(f"Invalid argument name: '{arg}'")
 
-        # Store function as dict with args and empty body list
-        self.functions[func_name] = {
-            'args': args,
-            'body': []
-        }
+        return func_name, args
 
-        self.defining_function = (func_name, indent)
-        self.function_stack = []  # Reset function stack
-        #if not importing:
-            #print(f"DEFINED: {func_name} with args {args}")
-
-    def _handle_alias(self, code: str):
+    def _handle_alias(self, instr: Instruction, importing: bool):
         # Example: alias p = print
-        try:
-            _, rest = code.split("alias", 1)
-            alias_def = rest.strip()
-            name, target = alias_def.split("=", 1)
-            name = name.strip()
-            target = target.strip()
-
-            if not self._validate_variable_name(name):
-                raise GuythonSyntaxError(f"Invalid alias name: {name}")
-            if not target:
-                raise GuythonSyntaxError("Alias target cannot be empty")
-
-            self.aliases[name] = target
-            self._debug_print(f"Alias created: {name} -> {target}")
-        except ValueError:
+        if not instr.operands:
             raise GuythonSyntaxError("Invalid alias syntax. Use: alias name = target")
 
+        name, target = instr.operands
+
+        if not self._validate_variable_name(name):
+            raise GuythonSyntaxError(f"Invalid alias name: {name}")
+        if not target:
+            raise GuythonSyntaxError("Alias target cannot be empty")
+
+        self.aliases[name] = target
+        self._debug_print(f"Alias created: {name} -> {target}")
+
 
-    def _handle_if(self, code: str, indent: int, importing: bool):
+    def _handle_if(self, instr: Instruction, importing: bool):
         """Handle if statement"""
-        # Handle both "if condition" and "ifcondition" syntax  
-        
-        if code.startswith('if '):
-            condition = code[3:].strip()
-        elif code.startswith('if'):
-            condition = code[2:].strip()
-        else:
-            condition = ""
+        indent = instr.indent
+        # Both "if condition" and "ifcondition" are split when decoding
+        condition = instr.operands[0]
 
         if not condition:
             raise GuythonSyntaxError("If statement missing condition")
 
         try:
-            evaluator = ExpressionEvaluator(self.variables, SAFE_FUNCTIONS)
-            result = evaluator.evaluate(condition)
+            result = self._evaluate(condition, instr.expr)
             is_true = bool(result)
             self.if_stack.append((is_true, indent))
             self.else_stack.append((not is_true, indent))
             self._debug_print(f"If condition '{condition}' evaluated to: {is_true}")
         except Exception as e:
             raise GuythonRuntimeError(f"Error in if condition: {e}")
-    def _handle_else(self, indent: int):
+    def _handle_else(self, instr: Instruction, importing: bool):
+        indent = instr.indent
         if not self.else_stack:
             raise GuythonSyntaxError("Unexpected 'else' without matching 'if'")
 
@@ -856,10 +975,26 @@ update {name}    - update the specified package to latest version
 
         self.if_stack.append((should_run, indent))  # treat like a conditional block
 
+    def _handle_while(self, instr: Instruction, importing: bool):
+        """Handle while loop"""
+        indent = instr.indent
+        # Both "while condition" and "whilecondition" are split when decoding
+        condition = instr.operands[0]
+
+        if not condition:
+            raise GuythonSyntaxError("While loop missing condition")
+
+        self.loop_stack.append((instr, indent, []))
+        self._debug_print(f"Starting while loop with condition: {condition}")
+
+
+    def _handle_for(self, instr: Instruction, importing: bool):
+        """Handle for loop, its body is collected and compiled like a while loop's"""
+        self.loop_stack.append((instr, instr.indent, []))
     
-    def _handle_import(self, code: str, importing: bool):
+    def _handle_import(self, instr: Instruction, importing: bool):
         """Handle import statement"""
-        filename = code[6:].strip()
+        filename = instr.operands[0]
         
         if not (filename.endswith(".gy") or filename.endswith(".guy")):
             raise GuythonSyntaxError("Invalid file type: Given file must be .gy or .guy")
@@ -878,12 +1013,12 @@ update {name}    - update the specified package to latest version
         self.variables[module_name] = SimpleNamespace(**module_vars)
         self._debug_print(f"Imported module: {module_name}")
 
-    def _handle_guython_command(self, code: str, importing: bool):
+    def _handle_guython_command(self, instr: Instruction, importing: bool):
         """Handle guython command to execute another Guython file"""
         if importing:
             return
 
-        filename = code[8:].strip()  # Remove "guython " prefix
+        filename = instr.code[8:].strip()  # Remove "guython " prefix
 
         if not (filename.endswith('.gy') or filename.endswith('.guy')):
             raise GuythonSyntaxError("Invalid file type. Given file must be .gy or .guy")
@@ -892,137 +1027,387 @@ update {name}    - update the specified package to latest version
             raise GuythonRuntimeError(f"File not found: {filename}")
 
         try:
-            with open(filename, 'r') as f:
-                lines = f.readlines()
-                self.run_program(lines)
+            self.run_file(filename)
         except Exception as e:
             raise GuythonRuntimeError(f"Error executing file {filename}: {e}")
     
-    def _handle_function_call(self, code: str, importing: bool):
+    def _handle_function_call(self, instr: Instruction, importing: bool):
         """Handle calls like 'funcname_ arg1, arg2'"""
-        #print(f"DEBUG: Handling function call: '{code}'")
-
-        # Split code into function name and arg string
-        if ' ' in code:
-            func_name, args_str = code.split(' ', 1)
-            args_str = args_str.strip()
-            # Split arguments by comma, but be careful with whitespace
-            if args_str:
-                passed_args = [arg.strip() for arg in args_str.split(',')]
-            else:
-                passed_args = []
-        else:
-            func_name = code.strip()
-            passed_args = []
+        code, frame = self._enter_function(instr)
+        evaluator = self.evaluator
+        evaluator.frame = frame
+        self.call_depth += 1
+
+        try:
+            # Execute the body compiled when the function was defined
+            self._run_code(code, importing)
+        finally:
+            evaluator.frame = frame.parent
+            self.call_depth -= 1
 
-        #print(f"DEBUG: func_name='{func_name}', passed_args={passed_args}")
+    def _enter_function(self, instr: Instruction) -> Tuple[CodeBlock, Frame]:
+        """Check a call and bind its arguments in a new frame, the body is left to the caller to run"""
+        # Function name and arguments are split when decoding
+        func_name, passed_args = instr.operands
 
         # Remove trailing underscore from func_name
         if not func_name.endswith('_'):
             raise GuythonRuntimeError(f"Function call must end with '_', got: {func_name}")
         func_name = func_name[:-1]
 
-        #print(f"DEBUG: Looking for function '{func_name}' in functions: {list(self.functions.keys())}")
-
         # Check function exists
         if func_name not in self.functions:
             available = list(self.functions.keys())
             raise GuythonRuntimeError(f"Function '{func_name}' not found. Available: {available}")
 
+        if self.max_call_depth is not None and self.call_depth >= self.max_call_depth:
+            raise GuythonRuntimeError(f"Maximum recursion depth exceeded ({self.max_call_depth}) calling '{func_name}'")
+
         func = self.functions[func_name]
         declared_args = func['args']
-        body = func['body']
-
-        #print(f"DEBUG: Function found - declared_args={declared_args}, body={body}")
 
         # Check argument count
         if len(passed_args) != len(declared_args):
             raise GuythonRuntimeError(f"Function '{func_name}' expects {len(declared_args)} args, got {len(passed_args)}")
 
-        # Save current variable state
-        saved_vars = self.variables.copy()
+        # Evaluate passed arguments in the caller's scope and bind them to parameter slots
+        local_vars = {}
+        for i, (slot, argument) in enumerate(zip(func['slots'], passed_args)):
+            try:
+                # Simple argument evaluation
+                local_vars[slot] = self._evaluate_argument(argument)
+            except Exception as e:
+                raise GuythonRuntimeError(f"Error evaluating argument {i+1} ({argument[0]}): {e}")
+
+        # Parameters live in the new frame, other names resolve to the globals
+        return func['code'], Frame(func_name, local_vars, self.evaluator.frame)
+
+    def _run_code(self, code: CodeBlock, importing: bool = False, start: int = 0,
+                  resumable: bool = False) -> Optional[int]:
+        """Run compiled code, following jumps instead of tracking open blocks
+
+        Guython function calls don't nest on the Python stack, the caller's code,
+        position and loop state are pushed on a call stack while the body runs.
+        Resumable code stops when a package registers new statements and returns
+        the op to resume at once the rest of the program has been decoded again.
+        """
+        ops = code.ops
+        handlers = self._handlers
+        evaluator = self.evaluator
+        base_frame = evaluator.frame
+        calls: List[Tuple[CodeBlock, int, Dict[int, List]]] = []  # Suspended callers
+        debug = self.debug_mode  # Fused ops take the general path to keep debug output
+        # Loop state by op: [iterations, instruction count and time when the loop started]
+        loops: Dict[int, List] = {}
+        max_iterations = self.max_loop_iterations or sys.maxsize
+        check_budget = self.loop_time_limit is not None or self.loop_instruction_limit is not None
+        statements_version = self.statements.version
+        steps = 0
+        end = len(ops)
+        pc = start
 
         try:
-            # Evaluate passed arguments and bind to parameter names
-            for i, (param_name, arg_expr) in enumerate(zip(declared_args, passed_args)):
-                #print(f"DEBUG: Processing argument {i}: param_name='{param_name}', arg_expr='{arg_expr}'")
+            while True:
+                if pc >= end:
+                    if not calls:
+                        break
+                    # The function body finished, continue in its caller
+                    code, pc, loops = calls.pop()
+                    ops = code.ops
+                    end = len(ops)
+                    evaluator.frame = evaluator.frame.parent
+                    self.call_depth -= 1
+                    if resumable and not calls and self.statements.version != statements_version:
+                        return pc
+                    continue
+
+                opcode, instr, arg = ops[pc]
+                pc += 1
+                steps += 1
                 try:
-                    # Simple argument evaluation
-                    arg_value = self._evaluate_argument(arg_expr)
-                    #print(f"DEBUG: Evaluated '{arg_expr}' to {arg_value}")
+                    if opcode == OP_EXEC:
+                        self.current_line_number = instr.line_number
+                        handlers[instr.kind](instr, importing)
+                    elif opcode == OP_INCREMENT:
+                        self.current_line_number = instr.line_number
+                        slot, delta = arg
+                        frame = evaluator.frame
+                        store = evaluator.store
+                        if frame is not None and slot in frame.locals:
+                            variables = frame.locals
+                        elif store is not None and slot < len(store.cells):
+                            variables = store.cells
+                        else:
+                            variables = None
+                        value = variables[slot] if variables is not None else UNSET
+                        if (type(value) is int or type(value) is float) and not debug:
+                            variables[slot] = value + delta
+                        else:
+                            handlers['assign'](instr, importing)
+                    elif opcode == OP_BINARY:
+                        self.current_line_number = instr.line_number
+                        store = evaluator.store
+                        if evaluator.frame is None and store is not None:
+                            # Globals only, index the cells directly
+                            cells = store.cells
+                            size = len(cells)
+                            slot = arg.left_slot
+                            left = arg.left_value if slot is None else cells[slot] if slot < size else UNSET
+                            slot = arg.right_slot
+                            right = arg.right_value if slot is None else cells[slot] if slot < size else UNSET
+                        else:
+                            left = arg.left_value if arg.left_slot is None else self._load_slot(arg.left_slot)
+                            right = arg.right_value if arg.right_slot is None else self._load_slot(arg.right_slot)
+                        guard = arg.guard
+                        if guard is not None and type(left) is guard and type(right) is guard:
+                            try:
+                                value = arg.op_func(left, right)
+                            except Exception:
+                                # The general statement reports the error
+                                handlers['assign'](instr, importing)
+                            else:
+                                evaluator.assign(arg.target, instr.operands[0], value)
+                                if debug:
+                                    self._debug_print(f"Assigned {instr.operands[0]} = {value}")
+                        else:
+                            self._quicken(instr, arg, left, right)
+                            handlers['assign'](instr, importing)
+                    elif opcode == OP_JUMP:
+                        pc = arg
+                    elif opcode == OP_CALL:
+                        self.current_line_number = instr.line_number
+                        body, frame = self._enter_function(instr)
+                        calls.append((code, pc, loops))
+                        self.call_depth += 1
+                        evaluator.frame = frame
+                        code = body
+                        ops = code.ops
+                        end = len(ops)
+                        pc = 0
+                        loops = {}
+                    elif opcode == OP_LOOP or opcode == OP_COMPARE_LOOP:
+                        if opcode == OP_LOOP:
+                            exit_pc = arg
+                            running = self._test_condition(instr)
+                        else:
+                            exit_pc, slot, compare, constant = arg
+                            value = self._load_slot(slot)
+                            if type(value) is int or type(value) is float:
+                                running = compare(value, constant)
+                            else:
+                                running = self._test_condition(instr)
+                        if running:
+                            state = loops.get(pc)
+                            if state is None:
+                                loops[pc] = [1, self.instruction_count + steps, time.monotonic() if check_budget else 0]
+                            else:
+                                count = state[0] + 1
+                                if count > max_iterations:
+                                    raise GuythonRuntimeError(f"Loop exceeded maximum iterations ({max_iterations})")
+                                state[0] = count
+                                if check_budget and count % LOOP_CHECK_INTERVAL == 0:
+                                    self._check_loop_budget(state, self.instruction_count + steps)
+                        else:
+                            loops.pop(pc, None)
+                            pc = exit_pc
+                    elif opcode == OP_FOR_ITER:
+                        state = loops.get(pc)
+                        value = next(state[3], UNSET) if state is not None else UNSET
+                        if value is UNSET:
+                            # Used up, or entered by a goto without starting the loop
+                            loops.pop(pc, None)
+                            pc = arg
+                        else:
+                            count = state[0] + 1
+                            if count > state[4]:
+                                raise GuythonRuntimeError(f"Loop exceeded maximum iterations ({state[4]})")
+                            state[0] = count
+                            if check_budget and count % LOOP_CHECK_INTERVAL == 0:
+                                self._check_loop_budget(state, self.instruction_count + steps)
+                            slot = instr.target
+                            store = evaluator.store
+                            if evaluator.frame is None and store is not None and slot < len(store.cells) \
+                                    and store.cells[slot] is not UNSET:
+                                store.cells[slot] = value
+                            else:
+                                evaluator.assign(slot, instr.operands[0], value)
+                    elif opcode == OP_GET_ITER:
+                        self.current_line_number = instr.line_number
+                        # The FOR op after this one finds the loop state under its own position
+                        loops[pc + 1] = self._start_for_loop(instr, self.instruction_count + steps, check_budget)
+                    elif opcode == OP_SETUP_LOOP:
+                        # State left by a goto out of the loop must not carry over into this run of it
+                        loops.pop(pc + 1, None)
+                    elif opcode == OP_BRANCH:
+                        self.current_line_number = instr.line_number
+                        if not self._test_condition(instr):
+                            pc = arg
+                    elif opcode == OP_COMPARE_BRANCH:
+                        self.current_line_number = instr.line_number
+                        false_pc, slot, compare, constant = arg
+                        value = self._load_slot(slot)
+                        if (type(value) is int or type(value) is float) and not debug:
+                            if not compare(value, constant):
+                                pc = false_pc
+                        elif not self._test_condition(instr):
+                            pc = false_pc
+                    elif opcode == OP_PRINT:
+                        self.current_line_number = instr.line_number
+                        if not importing:
+                            self._print_template(instr, arg)
+                    elif opcode == OP_GOTO:
+                        self._count_goto(instr.operands[1])
+                        pc = arg
+                    elif opcode == OP_DEF:
+                        func_name, args = self._parse_function_definition(instr)
+                        self._define_function(func_name, args, *arg)
+                    else:
+                        raise GuythonSyntaxError(arg)
 
-                    # Bind to parameter name in current scope
-                    self.variables[param_name] = arg_value
-                    #print(f"DEBUG: Bound parameter {param_name} = {arg_value}")
+                except GuythonJumpLimitError:
+                    raise
                 except Exception as e:
-                    print(f"DEBUG: Error evaluating argument: {e}")
-                    raise GuythonRuntimeError(f"Error evaluating argument {i+1} ({arg_expr}): {e}")
+                    if not importing:
+                        prefix = "GuythonError" if isinstance(e, GuythonError) else "Unexpected error"
+                        self._report_error(instr, f"{prefix}: {e}")
+                    if opcode in (OP_BRANCH, OP_LOOP, OP_COMPARE_BRANCH, OP_COMPARE_LOOP, OP_GET_ITER, OP_FOR_ITER):
+                        # A condition that cannot be evaluated or a spent budget skips the block
+                        loops.pop(pc, None)
+                        pc = arg[0] if opcode in (OP_COMPARE_BRANCH, OP_COMPARE_LOOP) else arg
+
+                if self.pending_goto is not None:
+                    # A goto to a line outside this code returns from calls until a caller has
+                    # the line, or leaves it for the caller of this run
+                    target = code.lines.get(self.pending_goto)
+                    while target is None and calls:
+                        code, pc, loops = calls.pop()
+                        ops = code.ops
+                        end = len(ops)
+                        evaluator.frame = evaluator.frame.parent
+                        self.call_depth -= 1
+                        target = code.lines.get(self.pending_goto)
+                    if target is None:
+                        return
+                    self._count_goto(self.pending_goto)
+                    self.pending_goto = None
+                    pc = target
 
-            #print(f"DEBUG: About to execute function body with {len(body)} lines")
-            # Execute function body
-            for indent, line in body:
-                #print(f"DEBUG: Executing function body line: indent={indent}, line='{line}'")
-                # Reconstruct the line with proper indentation
-                full_line = '.' * indent + line
-                #print(f"DEBUG: Reconstructed line: '{full_line}'")
-                self.run_line(full_line, importing=importing, line_number=self.current_line_number)
+                if resumable and not calls and self.statements.version != statements_version:
+                    return pc
+        finally:
+            self.instruction_count += steps
+            if calls:
+                # Leaving with calls still running, drop their frames
+                evaluator.frame = base_frame
+                self.call_depth -= len(calls)
+
+    def _load_slot(self, slot: int) -> Any:
+        """Get a variable by slot from the current frame or the globals, UNSET if it is missing"""
+        evaluator = self.evaluator
+        frame = evaluator.frame
+        if frame is not None:
+            value = frame.locals.get(slot, UNSET)
+            if value is not UNSET:
+                return value
+        store = evaluator.store
+        return store.load(slot) if store is not None else UNSET
+
+    def _quicken(self, instr: Instruction, site: Any, left: Any, right: Any):
+        """Feed the operand types of a general run to a binary assignment's site"""
+        if site.guard is not None:
+            site.deoptimize()
+            if self.debug_mode:
+                self._debug_print(f"Line {instr.line_number}: de-optimised '{instr.code}', "
+                                  f"got {type(left).__name__}/{type(right).__name__}")
+        elif site.observe(left, right) and self.debug_mode:
+            self._debug_print(f"Line {instr.line_number}: specialised '{instr.code}' for {site!r}")
+
+    def _print_template(self, instr: Instruction, template: Tuple):
+        """Print from pre-split literals and variable slots, using the print handler for anything else"""
+        parts = []
+        for literal, slot in template:
+            if slot is None:
+                parts.append(literal)
+                continue
+            value = self._load_slot(slot)
+            if value is UNSET:
+                # Functions and undefined names are left to the expression evaluator
+                return self._handle_print(instr, False)
+            parts.append(str(value))
+        self.output.write(''.join(parts))
+
+    def _start_for_loop(self, instr: Instruction, instruction_count: int, check_budget: bool) -> List:
+        """Evaluate the iterable of a for loop and build its loop state, nothing is copied
+
+        Loops over ranges, arrays, strings and other sized values end on their
+        own and only the time and instruction budgets apply, plain iterators
+        are also held to the iteration limit.
+        """
+        name, source = instr.operands
+        if instr.target is None:
+            raise GuythonSyntaxError(f"Invalid loop variable name: '{name}'")
+        try:
+            iterable = self._evaluate(source, instr.expr)
+        except Exception as e:
+            raise GuythonRuntimeError(f"Error in for loop: {e}")
+        try:
+            iterator = iter(iterable)
+        except TypeError:
+            raise GuythonRuntimeError(f"Cannot loop over value of type {type(iterable).__name__}")
+        limit = sys.maxsize if hasattr(iterable, '__len__') else self.max_loop_iterations or sys.maxsize
+        self._debug_print(f"Starting for loop over {source}")
+        return [0, instruction_count, time.monotonic() if check_budget else 0, iterator, limit]
+
+    def _check_loop_budget(self, state: List, instruction_count: int):
+        """Stop a loop that has used up its wall-clock or instruction budget"""
+        iterations, start_count, start_time = state[:3]
+        limit = self.loop_instruction_limit
+        if limit is not None and instruction_count - start_count > limit:
+            raise GuythonRuntimeError(f"Loop exceeded maximum instructions ({limit}) after {iterations} iterations")
+        limit = self.loop_time_limit
+        if limit is not None and time.monotonic() - start_time > limit:
+            raise GuythonRuntimeError(f"Loop exceeded time limit ({limit}s) after {iterations} iterations")
+
+    def _test_condition(self, instr: Instruction) -> bool:
+        """Evaluate the condition of an if or while instruction"""
+        condition = instr.operands[0]
+        if instr.kind == 'if':
+            if not condition:
+                raise GuythonSyntaxError("If statement missing condition")
+            try:
+                result = bool(self._evaluate(condition, instr.expr))
+            except Exception as e:
+                raise GuythonRuntimeError(f"Error in if condition: {e}")
+            if self.debug_mode:
+                self._debug_print(f"If condition '{condition}' evaluated to: {result}")
+            return result
 
-            #print(f"DEBUG: Function '{func_name}' execution complete")
+        if not condition:
+            raise GuythonSyntaxError("While loop missing condition")
+        try:
+            return bool(self._evaluate(condition, instr.expr))
+        except Exception as e:
+            raise GuythonRuntimeError(f"Error in while loop: {e}")
 
-        finally:
-            # Restore original variable state (simple local scope simulation)
-            # Keep any global variables that were modified, but remove parameters
-            for param_name in declared_args:
-                if param_name in saved_vars:
-                    self.variables[param_name] = saved_vars[param_name]
-                elif param_name in self.variables:
-                    del self.variables[param_name]
-
-    def _evaluate_argument(self, arg_expr: str):
+    def _evaluate_argument(self, argument: Tuple[str, Any, Any]):
         """Simple argument evaluation that handles common cases"""
-        arg_expr = arg_expr.strip()
+        arg_expr, literal, node = argument
         #print(f"DEBUG: _evaluate_argument called with '{arg_expr}'")
 
-        # String literals
-        if (arg_expr.startswith('"') and arg_expr.endswith('"')) or \
-           (arg_expr.startswith("'") and arg_expr.endswith("'")):
-            result = arg_expr[1:-1]
-            #print(f"DEBUG: String literal result: '{result}'")
-            return result
-
-        # Number literals
-        try:
-            if '.' in arg_expr:
-                result = float(arg_expr)
-                #print(f"DEBUG: Float literal result: {result}")
-                return result
-            else:
-                result = int(arg_expr)
-                #print(f"DEBUG: Int literal result: {result}")
-                return result
-        except ValueError:
-            pass
+        # String and number literals are resolved when decoding
+        if literal is not NO_CONSTANT:
+            return literal
         
         # Variable lookup
-        if arg_expr in self.variables:
-            result = self.variables[arg_expr]
+        result = self.evaluator.lookup(arg_expr)
+        if result is not UNSET:
             #print(f"DEBUG: Variable lookup result: '{arg_expr}' = {result}")
             return result
 
-        # Array literals
-        if arg_expr.startswith('[') and arg_expr.endswith(']'):
-            try:
-                result = self._parse_array_literal(arg_expr)
-                print(f"DEBUG: Array literal result: {result}")
-                return result
-            except:
-                pass
-            
         #print(f"DEBUG: Falling back to expression evaluator for '{arg_expr}'")
         # Fall back to expression evaluator for complex expressions
         try:
-            evaluator = ExpressionEvaluator(self.variables, SAFE_FUNCTIONS)
-            result = evaluator.evaluate(arg_expr)
+            result = self._evaluate(arg_expr, node)
             #print(f"DEBUG: Expression evaluator result: {result}")
             return result
         except Exception as e:
@@ -1030,132 +1415,124 @@ update {name}    - update the specified package to latest version
             raise GuythonRuntimeError(f"Cannot evaluate argument '{arg_expr}': {e}")
 
     
-    def _handle_assignment(self, code: str, importing: bool):
+    def _handle_assignment(self, instr: Instruction, importing: bool):
         """Handle variable assignment"""
-        parts = code.split('=', 1)
-        if len(parts) != 2:
-            raise GuythonSyntaxError("Invalid assignment syntax")
-            
-        var_name = parts[0].strip()
-        expr = parts[1].strip()
+        var_name, expr = instr.operands
         
-        if not self._validate_variable_name(var_name):
+        # The name was validated and resolved to a slot when decoding
+        if instr.target is None:
             raise GuythonSyntaxError(f"Invalid variable name: '{var_name}'")
             
         try:
-            evaluator = ExpressionEvaluator(self.variables, SAFE_FUNCTIONS)
-            value = evaluator.evaluate(expr)
-            self.variables[var_name] = value
-            self._debug_print(f"Assigned {var_name} = {value}")
+            value = self._evaluate(expr, instr.expr)
+            self.evaluator.assign(instr.target, var_name, value)
+            if self.debug_mode:
+                self._debug_print(f"Assigned {var_name} = {value}")
         except Exception as e:
             raise GuythonRuntimeError(f"Error in assignment: {e}")
     
-    def _handle_print(self, code: str, importing: bool):
+    def _handle_item_assignment(self, instr: Instruction, importing: bool):
+        """Handle element assignment like x[0]=5 or x[i][j]=v"""
+        target, expr, container, index = instr.operands
+        if container is None or index is None:
+            raise GuythonSyntaxError(f"Invalid assignment target: '{target}'")
+
+        try:
+            value = self._evaluate(expr, instr.expr)
+            evaluate_parsed = self.evaluator.evaluate_parsed
+            set_item(evaluate_parsed(container), evaluate_parsed(index), value)
+            if self.debug_mode:
+                self._debug_print(f"Set {target} = {value}")
+        except GuythonError:
+            raise
+        except Exception as e:
+            raise GuythonRuntimeError(f"Error in array assignment: {e}")
+
+    def _handle_print(self, instr: Instruction, importing: bool):
         """Handle print statement"""
         if importing:
             return
             
-        rest = code[5:].strip()
-        if not rest:
-            print()
+        if not instr.operands:
+            self.output.print()
             return
             
-        # Split by commas outside quotes
-        chunks = self._split_outside_quotes(rest, ',')
-        output_parts = []
-        
-        for chunk in chunks:
-            chunk = chunk.strip()
-            tokens = self._tokenize_print_args(chunk)
-            piece = ''
-            
-            for token in tokens:
-                token = token.strip()
-                if (token.startswith('"') and token.endswith('"')) or \
-                   (token.startswith("'") and token.endswith("'")):
-                    piece += token[1:-1]
+        # Chunks were split by commas outside quotes and tokenized when decoding
+        parts = []
+        for index, tokens in enumerate(instr.operands):
+            if index:
+                parts.append(' ')
+            for literal, token, node in tokens:
+                if literal is not None:
+                    parts.append(literal)
                 else:
                     try:
-                        evaluator = ExpressionEvaluator(self.variables, SAFE_FUNCTIONS)
-                        value = evaluator.evaluate(token)
-                        piece += str(value)
+                        parts.append(str(self._evaluate(token, node)))
                     except:
-                        piece += '[Error]'
-            
-            output_parts.append(piece)
-        
-        print(' '.join(output_parts))
+                        parts.append('[Error]')
+        parts.append('\n')
+        self.output.write(''.join(parts))
     
-    def _handle_print_input(self, importing: bool):
+    def _handle_print_input(self, instr: Instruction, importing: bool):
         """Handle printinput command - FIXED"""
         if not importing:
             try:
+                self.flush_output()
                 user_input = input()
-                print(user_input)
+                self.output.print(user_input)
                 self._debug_print(f"Print input: {user_input}")
             except EOFError:
-                print()  # Handle EOF gracefully
+                self.output.print()  # Handle EOF gracefully
             except KeyboardInterrupt:
                 raise  # Let keyboard interrupt propagate
     
-    def _handle_input_assignment(self, code: str, importing: bool):
+    def _handle_input_assignment(self, instr: Instruction, importing: bool):
         """Handle input assignment with prompts"""
         if importing:
             return
 
-        # Handle both single and double quoted prompts
-        if '=input"' in code:
-            parts = code.split('=input"', 1)
-            var_name = parts[0].strip()
-            prompt = parts[1][:-1]  # Remove trailing quote
-        elif "=input '" in code:
-            parts = code.split("=input '", 1)
-            var_name = parts[0].strip()
-            prompt = parts[1][:-1]  # Remove trailing quote
-        else:
-            raise GuythonSyntaxError("Invalid input assignment syntax")
+        # Single and double quoted prompts are split when decoding
+        var_name, prompt = instr.operands
 
-        if not self._validate_variable_name(var_name):
+        if instr.target is None:
             raise GuythonSyntaxError(f"Invalid variable name: '{var_name}'")
 
         try:
+            self.flush_output()
             user_input = input(prompt)
 
             # Try to convert to number if possible
             try:
                 if '.' in user_input and user_input.replace('.', '', 1).isdigit():
-                    self.variables[var_name] = float(user_input)
+                    value = float(user_input)
                 elif user_input.lstrip('-').isdigit():
-                    self.variables[var_name] = int(user_input)
+                    value = int(user_input)
                 else:
-                    self.variables[var_name] = user_input
+                    value = user_input
             except ValueError:
-                self.variables[var_name] = user_input
+                value = user_input
 
-            self._debug_print(f"Assigned to {var_name}: {self.variables[var_name]}")
+            self.evaluator.assign(instr.target, var_name, value)
+            self._debug_print(f"Assigned to {var_name}: {value}")
         except EOFError:
-            self.variables[var_name] = ""
+            self.evaluator.assign(instr.target, var_name, "")
         except KeyboardInterrupt:
             raise
 
-    def _handle_input(self, code: str, importing: bool):
+    def _handle_input(self, instr: Instruction, importing: bool):
         """Handle standalone input with prompt"""
         if importing:
             return
 
-        if code.startswith('input"') and code.endswith('"'):
-            prompt = code[6:-1]
-        elif code.startswith("input'") and code.endswith("'"):
-            prompt = code[6:-1]
-        else:
-            prompt = ""
+        prompt = instr.operands[0]
 
         try:
+            self.flush_output()
             user_input = input(prompt) if prompt else input()
-            print(user_input)  # Echo input like Python
+            self.output.print(user_input)  # Echo input like Python
             return user_input
         except EOFError:
-            print()  # Handle EOF
+            self.output.print()  # Handle EOF
             return ""
         except KeyboardInterrupt:
             raise
@@ -1174,14 +1551,27 @@ update {name}    - update the specified package to latest version
     def _get_user_confirmation(self, message: str) -> bool:
         """Get Y/N confirmation from user"""
         try:
+            self.flush_output()
             response = input(f"{message} (Y/N): ").strip().lower()
             return response in ['y', 'yes']
         except (EOFError, KeyboardInterrupt):
             return False
 
 
-    def _handle_read(self, code: str, importing: bool):
-        """Handle read command with modifiers"""
+    def _handle_read(self, instr: Instruction, importing: bool):
+        """Handle read command with modifiers, streaming the file instead of loading it"""
+        code = instr.code
+        # Modifiers with a value, only the lines they select are read
+        selection = {}
+        for name, pattern in READ_SELECTIONS.items():
+            match = pattern.search(code)
+            if match:
+                selection[name] = match.group(match.lastindex)
+                code = code[:match.start()] + code[match.end():]
+        grep = selection.pop('grep', None)
+        if len(selection) > 1:
+            raise GuythonSyntaxError("Read can only take one of -head, -tail and -range")
+
         # Check for flags
         ignore_comments = '-ign' in code
         show_lines = '-lines' in code
@@ -1195,16 +1585,18 @@ update {name}    - update the specified package to latest version
 
         parts = code.split(None, 2)
         if len(parts) != 3:
-            raise GuythonSyntaxError("Read syntax: read [-ign] [-lines] [-size] [-exists] {filePath} {fileName}.{fileExtension}")
+            raise GuythonSyntaxError("Read syntax: read [-ign] [-lines] [-size] [-exists] [-head N | -tail N | -range a:b] "
+                                     "[-grep pattern] {filePath} {fileName}.{fileExtension}")
 
         _, file_path, filename = parts
         full_path = os.path.join(file_path, filename) if file_path != '.' else filename
+        self.files.flush(full_path)  # Pending appends of write are part of the file
 
         # Handle -exists flag
         if check_exists:
             exists = os.path.isfile(full_path)
             if not importing:
-                print("true" if exists else "false")
+                self.output.print("true" if exists else "false")
             return
 
         # Handle -size flag
@@ -1212,35 +1604,37 @@ update {name}    - update the specified package to latest version
             try:
                 size = os.path.getsize(full_path)
                 if not importing:
-                    print(self._format_file_size(size))
+                    self.output.print(self._format_file_size(size))
                 return
             except FileNotFoundError:
                 raise GuythonRuntimeError(f"File not found: {full_path}")
             except Exception as e:
                 raise GuythonRuntimeError(f"Error getting file size {full_path}: {e}")
 
-        # Read file content
-        try:
-            with open(full_path, 'r', encoding='utf-8') as f:
-                if show_lines:
-                    lines = f.readlines()
-                    # Remove newlines and apply comment stripping if needed
-                    if ignore_comments:
-                        lines = [self._strip_comments(line.rstrip('\n')) for line in lines]
-                    else:
-                        lines = [line.rstrip('\n') for line in lines]
+        # Nothing is read when the output would be thrown away
+        if importing:
+            return
 
-                    if not importing:
-                        for i, line in enumerate(lines, 1):
-                            print(f"{i}: {line}")
-                else:
-                    content = f.read()
+        output = self.output
+        try:
+            if selection or grep is not None or show_lines:
+                for number, line in self._read_lines(full_path, selection, grep, show_lines):
                     if ignore_comments:
-                        content = self._strip_comments(content)
-                    if not importing:
-                        print(content)
+                        line = strip_comments(line)
+                    output.write(f"{number}: {line}\n" if show_lines else f"{line}\n")
+            elif ignore_comments:
+                stripper = CommentStripper()
+                for chunk in stream_text(full_path):
+                    output.write(stripper.feed(chunk))
+                output.write('\n')
+            else:
+                for chunk in stream_text(full_path):
+                    output.write(chunk)
+                output.write('\n')
 
             self._debug_print(f"Read file: {full_path}")
+        except GuythonError:
+            raise
         except FileNotFoundError:
             raise GuythonRuntimeError(f"File not found: {full_path}")
         except PermissionError:
@@ -1248,12 +1642,96 @@ update {name}    - update the specified package to latest version
         except Exception as e:
             raise GuythonRuntimeError(f"Error reading file {full_path}: {e}")
 
-    def _handle_write(self, code: str, importing: bool):
+    def _handle_load_assignment(self, instr: Instruction, importing: bool):
+        """Handle x = readlines, loadcsv or loadjson {filePath} {fileName}
+
+        readlines binds the file's lines without reading them, the loaders
+        parse the file as it is read and keep only the picked columns and rows.
+        """
+        var_name, command, arguments = instr.operands
+        if instr.target is None:
+            raise GuythonSyntaxError(f"Invalid variable name: '{var_name}'")
+
+        options = {}
+        paths = []
+        words = iter(arguments)
+        for word in words:
+            if not word.startswith('-'):
+                paths.append(word)
+            elif word in LOAD_MODIFIERS[command]:
+                options[word] = next(words, None) if word in LOAD_VALUES else True
+                if options[word] is None:
+                    raise GuythonSyntaxError(LOAD_SYNTAX[command])
+            else:
+                raise GuythonSyntaxError(f"Unknown {command} modifier: {word}")
+        if len(paths) != 2:
+            raise GuythonSyntaxError(LOAD_SYNTAX[command])
+        rows = options.get('-rows')
+        if rows is not None:
+            if not rows.isdigit():
+                raise GuythonSyntaxError(f"Row limit must be a whole number, got '{rows}'")
+            rows = int(rows)
+        columns = parse_columns(options['-columns']) if '-columns' in options else None
+        by_column = '-bycolumn' in options
+
+        file_path, filename = paths
+        full_path = os.path.join(file_path, filename) if file_path != '.' else filename
+        self.files.flush(full_path)  # Pending appends of write are part of the file
+        if not os.path.isfile(full_path):
+            raise GuythonRuntimeError(f"File not found: {full_path}")
+
+        try:
+            if command == 'readlines':
+                # Nothing is read until the lines are used
+                if not os.access(full_path, os.R_OK):
+                    raise PermissionError(full_path)
+                value = LineFile(full_path, self.files)
+            elif command == 'loadcsv':
+                value = load_csv(full_path, columns, rows, '-header' in options, by_column)
+            else:
+                value = load_json(full_path, columns, rows, by_column)
+        except GuythonError:
+            raise
+        except PermissionError:
+            raise GuythonRuntimeError(f"Permission denied reading file: {full_path}")
+        except Exception as e:
+            raise GuythonRuntimeError(f"Error reading file {full_path}: {e}")
+
+        self.evaluator.assign(instr.target, var_name, value)
+        self._debug_print(f"Loaded {full_path} into {var_name} with {command}")
+
+    def _read_lines(self, path: str, selection: Dict[str, str], grep: Optional[str],
+                    numbered: bool) -> Iterator[Tuple[Any, str]]:
+        """Numbered lines picked by the -head, -tail, -range and -grep modifiers of read"""
+        lines = None
+        if 'head' in selection:
+            lines = head_lines(path, int(selection['head']))
+        elif 'range' in selection:
+            first, last = selection['range'].split(':')
+            first = int(first) if first else None
+            last = int(last) if last else None
+            if first is not None and last is not None and first > last:
+                raise GuythonRuntimeError(f"Read range {first}:{last} ends before it starts")
+            lines = range_lines(path, first, last)
+        elif 'tail' in selection:
+            offset, tail = tail_lines(path, int(selection['tail']))
+            # Counting the lines before the tail means reading them, only done for -lines
+            first = count_lines_before(path, offset) + 1 if numbered else 0
+            lines = enumerate(tail, first)
+        if grep is not None:
+            return grep_lines(path, grep, lines)
+        return lines if lines is not None else iter_lines(path)
+
+    def _handle_write(self, instr: Instruction, importing: bool):
         """Handle write command with modifiers"""
+        code = instr.code
         # Check for flags
         add_mode = '-add' in code
         ignore_comments = '-ign' in code
         create_only = '-create' in code
+        atomic = '-atomic' in code or self.atomic_writes
+        if add_mode and '-atomic' in code:
+            raise GuythonSyntaxError("-atomic replaces the whole file and can't be used with -add")
 
         # Handle permissions flag
         permissions = None
@@ -1267,38 +1745,36 @@ update {name}    - update the specified package to latest version
                 raise GuythonSyntaxError("Permissions syntax: -permissions <mode> (e.g., -permissions 755)")
 
         # Remove other flags
-        for flag in ['-add', '-ign', '-create']:
+        for flag in ['-add', '-ign', '-create', '-atomic']:
             code = code.replace(flag, '')
         code = code.strip()
 
         parts = code.split(None, 3)
         if len(parts) != 4:
-            syntax_msg = "Write syntax: write [-add] [-ign] [-create] [-permissions <mode>] {filePath} {fileName}.{fileExtension} {fileContents}"
+            syntax_msg = "Write syntax: write [-add] [-ign] [-create] [-atomic] [-permissions <mode>] {filePath} {fileName}.{fileExtension} {fileContents}"
             raise GuythonSyntaxError(syntax_msg)
 
         _, file_path, filename, content = parts
         full_path = os.path.join(file_path, filename) if file_path != '.' else filename
 
-        # Check if file exists and handle -create flag
-        file_exists = os.path.isfile(full_path)
+        # Check if file exists and handle -create flag, one stat gives its size too
+        files = self.files
+        files.flush(full_path)  # Appends still in the pool count as content
+        try:
+            file_stat = os.stat(full_path)
+        except OSError:
+            file_stat = None
+        file_exists = file_stat is not None and S_ISREG(file_stat.st_mode)
         if create_only and file_exists:
             if not importing:
-                print(f"File already exists: {full_path}")
+                self.output.print(f"File already exists: {full_path}")
             return
 
         # Get confirmation if file exists and has content (and not in add mode)
         if file_exists and not add_mode and not importing:
-            try:
-                # Check if file has content
-                with open(full_path, 'r', encoding='utf-8') as f:
-                    existing_content = f.read().strip()
-
-                if existing_content:  # File has content
-                    if not self._get_user_confirmation(f"File '{full_path}' already contains data. Overwrite?"):
-                        print("Write operation cancelled.")
-                        return
-            except Exception:
-                pass  # If we can't read the file, proceed with write attempt
+            if not self._confirm_overwrite(full_path, file_stat.st_size):
+                self.output.print("Write operation cancelled.")
+                return
             
         # Process content
         if (content.startswith('"') and content.endswith('"')) or \
@@ -1306,13 +1782,12 @@ update {name}    - update the specified package to latest version
             content = content[1:-1]
         else:
             try:
-                evaluator = ExpressionEvaluator(self.variables, SAFE_FUNCTIONS)
-                content = str(evaluator.evaluate(content))
+                content = str(self.evaluator.evaluate(content))
             except:
                 pass
             
         if ignore_comments:
-            content = self._strip_comments(content)
+            content = strip_comments(content)
 
         try:
             # Create directory if it doesn't exist
@@ -1320,16 +1795,23 @@ update {name}    - update the specified package to latest version
             if dir_path and not os.path.exists(dir_path):
                 os.makedirs(dir_path)
 
-            # Write file
-            mode = 'a' if add_mode else 'w'
-            with open(full_path, mode, encoding='utf-8') as f:
-                if add_mode:
-                    f.write('\n' + content)
-                else:
-                    f.write(content)
+            # Appends go through a pooled handle that stays open for the next write
+            if add_mode:
+                files.append(full_path, '\n' + content)
+            elif atomic:
+                # The temp file gets the permissions before it is renamed into place
+                mode = None
+                if permissions:
+                    try:
+                        mode = int(permissions, 8)
+                    except ValueError:
+                        raise GuythonRuntimeError(f"Invalid permissions format: {permissions}")
+                files.write(full_path, content, atomic=True, permissions=mode)
+            else:
+                files.write(full_path, content)
 
             # Set permissions if specified
-            if permissions:
+            if permissions and not (atomic and not add_mode):
                 try:
                     os.chmod(full_path, int(permissions, 8))  # Convert octal string to int
                 except ValueError:
@@ -1339,7 +1821,7 @@ update {name}    - update the specified package to latest version
 
             action = "appended to" if add_mode else "written"
             if not importing:
-                print(f"File {action}: {full_path}")
+                self.output.print(f"File {action}: {full_path}")
             self._debug_print(f"{'Appended to' if add_mode else 'Wrote'} file: {full_path}")
 
         except PermissionError:
@@ -1347,112 +1829,96 @@ update {name}    - update the specified package to latest version
         except Exception as e:
             raise GuythonRuntimeError(f"Error writing file {full_path}: {e}")
     
+    def _handle_save(self, instr: Instruction, importing: bool):
+        """Handle savecsv and savejson, writing the value of an expression to a file"""
+        code = instr.code
+        command = code.split(None, 1)[0]
+        header = None
+        if command == 'savecsv':
+            match = SAVE_HEADER.search(code)
+            if match:
+                header = parse_columns(match.group(match.lastindex))
+                code = code[:match.start()] + code[match.end():]
+        by_column = command == 'savecsv' and '-bycolumn' in code
+        atomic = '-atomic' in code or self.atomic_writes
+        for flag in ['-bycolumn', '-atomic']:
+            code = code.replace(flag, '')
+
+        parts = code.strip().split(None, 3)
+        if len(parts) != 4:
+            if command == 'savecsv':
+                raise GuythonSyntaxError("Savecsv syntax: savecsv [-header a,b] [-bycolumn] [-atomic] "
+                                         "{filePath} {fileName}.{fileExtension} {rows}")
+            raise GuythonSyntaxError("Savejson syntax: savejson [-atomic] {filePath} {fileName}.{fileExtension} {value}")
+
+        _, file_path, filename, expression = parts
+        full_path = os.path.join(file_path, filename) if file_path != '.' else filename
+        try:
+            value = self._evaluate(expression)
+        except Exception as e:
+            raise GuythonRuntimeError(f"Error in {command}: {e}")
+
+        files = self.files
+        files.flush(full_path)
+        try:
+            file_stat = os.stat(full_path)
+        except OSError:
+            file_stat = None
+        if file_stat is not None and S_ISREG(file_stat.st_mode) and not importing:
+            if not self._confirm_overwrite(full_path, file_stat.st_size):
+                self.output.print("Write operation cancelled.")
+                return
+
+        writer = csv_writer(value, header, by_column) if command == 'savecsv' else json_writer(value)
+        try:
+            dir_path = os.path.dirname(full_path)
+            if dir_path and not os.path.exists(dir_path):
+                os.makedirs(dir_path)
+            files.replace(full_path, writer, atomic)
+            if not importing:
+                self.output.print(f"File written: {full_path}")
+            self._debug_print(f"Saved {command[4:].upper()} file: {full_path}")
+        except PermissionError:
+            raise GuythonRuntimeError(f"Permission denied writing to file: {full_path}")
+        except Exception as e:
+            raise GuythonRuntimeError(f"Error writing file {full_path}: {e}")
+
+    def _confirm_overwrite(self, path: str, size: int) -> bool:
+        """Ask before replacing a file that has content, going ahead if it can't be read"""
+        try:
+            if has_content(path, size):
+                return self._get_user_confirmation(f"File '{path}' already contains data. Overwrite?")
+        except Exception:
+            pass
+        return True
+
     def _load_vars_from_file(self, filename: str) -> Dict[str, Any]:
         """Load variables from a Guython file without executing code"""
         vars_dict = {}
+        evaluator = ExpressionEvaluator({}, SAFE_FUNCTIONS)
         
         try:
-            with open(filename, 'r') as f:
-                for line_num, line in enumerate(f, 1):
-                    line = self._strip_comments(line).strip()
+            for instr in self.load_program(filename):
+                # Only top level assignments are loaded, nothing else runs
+                if instr.kind != 'assign' or instr.indent:
+                    continue
                     
-                    # Skip empty lines and non-assignment statements
-                    if not line or line.startswith(('def', 'while', 'if', 'print', 'import', 'goto')):
-                        continue
-                        
-                    if '=' in line and not line.endswith('=input'):
-                        parts = line.split('=', 1)
-                        var_name = parts[0].strip()
-                        expr = parts[1].strip()
-                        
-                        if self._validate_variable_name(var_name):
-                            try:
-                                evaluator = ExpressionEvaluator({}, SAFE_FUNCTIONS)
-                                value = evaluator.evaluate(expr)
-                                vars_dict[var_name] = value
-                            except:
-                                self._debug_print(f"Skipped invalid assignment on line {line_num}: {line}")
+                var_name, expr = instr.operands
+                if self._validate_variable_name(var_name):
+                    try:
+                        if instr.expr is not None:
+                            value = evaluator.evaluate_parsed(instr.expr)
+                        else:
+                            value = evaluator.evaluate(expr)
+                        vars_dict[var_name] = value
+                    except:
+                        self._debug_print(f"Skipped invalid assignment on line {instr.line_number}: {instr.code}")
                                 
         except IOError as e:
             raise GuythonRuntimeError(f"Error reading file {filename}: {e}")
             
         return vars_dict
     
-    def _split_outside_quotes(self, s: str, delimiter: str) -> List[str]:
-        """Split string by delimiter, ignoring delimiters inside quotes"""
-        result = []
-        current = ''
-        in_single = False
-        in_double = False
-        
-        for c in s:
-            if c == "'" and not in_double:
-                in_single = not in_single
-                current += c
-            elif c == '"' and not in_single:
-                in_double = not in_double
-                current += c
-            elif c == delimiter and not in_single and not in_double:
-                result.append(current)
-                current = ''
-            else:
-                current += c
-                
-        result.append(current)
-        return result
-    
-    def _tokenize_print_args(self, args_str: str) -> List[str]:
-        """Tokenize print arguments"""
-        tokens = []
-        current = ''
-        in_single = False
-        in_double = False
-        i = 0
-        
-        while i < len(args_str):
-            c = args_str[i]
-            
-            if c == "'" and not in_double:
-                if in_single:
-                    current += c
-                    tokens.append(current)
-                    current = ''
-                    in_single = False
-                else:
-                    if current:
-                        tokens.append(current)
-                        current = ''
-                    current = c
-                    in_single = True
-                    
-            elif c == '"' and not in_single:
-                if in_double:
-                    current += c
-                    tokens.append(current)
-                    current = ''
-                    in_double = False
-                else:
-                    if current:
-                        tokens.append(current)
-                        current = ''
-                    current = c
-                    in_double = True
-                    
-            elif c == ' ' and not in_single and not in_double:
-                if current:
-                    tokens.append(current)
-                    current = ''
-                    
-            else:
-                current += c
-                
-            i += 1
-            
-        if current:
-            tokens.append(current)
-            
-        return tokens
-    
     def _close_blocks(self, indent: int):
         """Close blocks based on indentation level"""
         # Close if blocks
@@ -1460,43 +1926,24 @@ update {name}    - update the specified package to latest version
             closed_if = self.if_stack.pop()
             self._debug_print(f"Closed if block: was_active={closed_if[0]}, indent={closed_if[1]}")
 
-        # Execute and close while loops
-        while self.loop_stack and self.loop_stack[-1][1] >= indent:
-            condition, level, block = self.loop_stack.pop()
-            self._execute_loop(condition, block)
+        # Execute and close while loops, stopping at a goto out of them
+        while self.loop_stack and self.loop_stack[-1][1] >= indent and self.pending_goto is None:
+            loop_instr, level, block = self.loop_stack.pop()
+            self._execute_loop(loop_instr, block)
     
-    def _execute_loop(self, condition: str, block: List[Tuple[int, str]]):
-        """Execute a while loop with safety measures"""
-        iteration_count = 0
-        evaluator = ExpressionEvaluator(self.variables, SAFE_FUNCTIONS)
-        
-        try:
-            while evaluator.evaluate(condition):
-                if iteration_count >= MAX_LOOP_ITERATIONS:
-                    raise GuythonRuntimeError(f"Loop exceeded maximum iterations ({MAX_LOOP_ITERATIONS})")
-                    
-                for block_indent, block_line in block:
-                    self.run_line('.' * block_indent + block_line)
-                    
-                iteration_count += 1
-                
-                # Re-create evaluator to get updated variables
-                evaluator = ExpressionEvaluator(self.variables, SAFE_FUNCTIONS)
-                
-        except GuythonError:
-            raise
-        except Exception as e:
-            raise GuythonRuntimeError(f"Error in while loop: {e}")
+    def _execute_loop(self, loop_instr: Instruction, block: List[Instruction]):
+        """Compile a collected while loop once and run it within the loop budgets"""
+        self._run_code(compile_block([loop_instr] + block, self.use_superinstructions))
     
     def execute_remaining_loops(self):
         """Execute any remaining loops at the end of the program"""
-        while self.loop_stack:
-            condition, level, block = self.loop_stack.pop()
-            self._execute_loop(condition, block)
+        while self.loop_stack and self.pending_goto is None:
+            loop_instr, level, block = self.loop_stack.pop()
+            self._execute_loop(loop_instr, block)
     
     def get_variables(self) -> Dict[str, Any]:
         """Get current variables (for debugging)"""
-        return self.variables.copy()
+        return dict(self.variables)
     
     def get_functions(self) -> Dict[str, List[Tuple[int, str]]]:
         """Get defined functions (for debugging)"""
@@ -0,0 +1,272 @@
+import ast
+import sys
+from typing import Any, Dict, List, Set
+
+from .compiler import NO_CONSTANT, Block, Instruction
+from .constants import SAFE_FUNCTIONS, SAFE_OPERATIONS
+from .evaluator import BINARY_OPERATORS, COMPARE_OPERATORS, ParsedExpression
+
+# Built-ins that always give the same result for the same constant arguments
+PURE_FUNCTIONS = frozenset([
+    'abs', 'round', 'int', 'float', 'str', 'len', 'max', 'min', 'sum',
+    'sqrt', 'sin', 'cos', 'tan',
+])
+PURE_CONSTANTS = frozenset(['pi', 'e'])
+
+# Longest string and largest int (in bits) that folding may produce
+MAX_FOLDED_SIZE = 4096
+
+
+class ConstantPool:
+    """Shares one object for every distinct literal value of a program"""
+
+    def __init__(self):
+        self.values: Dict[Any, Any] = {}
+
+    def intern(self, value: Any) -> Any:
+        """Get the pooled object equal to value"""
+        if isinstance(value, str):
+            value = sys.intern(value)
+        try:
+            return self.values.setdefault((type(value), value), value)
+        except TypeError:
+            return value
+
+    def __len__(self):
+        return len(self.values)
+
+
+def _foldable_size(value: Any) -> bool:
+    """Check that a folded value is a small literal"""
+    if isinstance(value, str):
+        return len(value) <= MAX_FOLDED_SIZE
+    if isinstance(value, bool) or isinstance(value, float):
+        return True
+    if isinstance(value, int):
+        return value.bit_length() <= MAX_FOLDED_SIZE
+    return False
+
+
+def _too_large(op_name: str, left: Any, right: Any) -> bool:
+    """Guess whether an operation would build an oversized value, before running it"""
+    if op_name == 'Pow' and isinstance(left, int) and isinstance(right, int):
+        return right > 0 and abs(left) > 1 and right * abs(left).bit_length() > MAX_FOLDED_SIZE
+    if op_name == 'Mult':
+        for text, count in ((left, right), (right, left)):
+            if isinstance(text, str) and isinstance(count, int):
+                return len(text) * count > MAX_FOLDED_SIZE
+    return False
+
+
+class Optimizer:
+    """Constant folding, dead block removal and literal interning over a block tree"""
+
+    def __init__(self, program: List[Instruction]):
+        self.program = program
+        self.pool = ConstantPool()
+        self.notes: List[str] = []
+        self.folded = 0
+        self.removed = 0
+        # Blocks containing a goto target are kept so the jump still has somewhere to land
+        self.goto_targets: Set[int] = {
+            instr.operands[1] for instr in program
+            if instr.kind == 'goto' and instr.operands[1] is not None
+        }
+
+    def optimize(self, nodes: List[Any]) -> List[Any]:
+        """Optimize a block tree built from the program"""
+        return self._optimize_nodes(nodes)
+
+    def summary(self) -> str:
+        """Describe what the optimizer did"""
+        return f"{self.folded} folded, {self.removed} blocks removed, {len(self.pool)} pooled constants"
+
+    def _optimize_nodes(self, nodes: List[Any]) -> List[Any]:
+        result = []
+        for node in nodes:
+            if isinstance(node, Block):
+                result.extend(self._optimize_block(node))
+            else:
+                result.append(self._optimize_instruction(node))
+        return result
+
+    def _optimize_block(self, block: Block) -> List[Any]:
+        """Optimize a block, replacing if and while blocks whose condition is constant"""
+        instr = self._optimize_instruction(block.instr)
+        value = self._constant_condition(instr)
+
+        if value is not NO_CONSTANT and not self._has_goto_target(block):
+            lines = f"lines {block.start + 1}-{block.end}"
+            if instr.kind == 'while' and not value:
+                self.removed += 1
+                self.notes.append(f"[Line {instr.line_number}] removed while block that never runs ({lines})")
+                return [self._placeholder(instr)]
+            if instr.kind == 'if':
+                self.removed += 1
+                if value:
+                    # Only the true path remains, else bodies are dropped
+                    body = [node for node in block.body
+                            if not (isinstance(node, Block) and node.instr.kind == 'else')]
+                    self.notes.append(f"[Line {instr.line_number}] if condition is always true ({lines})")
+                else:
+                    # Only the else bodies remain
+                    body = []
+                    for node in block.body:
+                        if isinstance(node, Block) and node.instr.kind == 'else':
+                            body.append(self._placeholder(node.instr))
+                            body.extend(node.body)
+                    self.notes.append(f"[Line {instr.line_number}] if condition is always false ({lines})")
+                return [self._placeholder(instr)] + self._optimize_nodes(body)
+
+        optimized = Block(instr, block.start)
+        optimized.end = block.end
+        optimized.body = self._optimize_nodes(block.body)
+        return [optimized]
+
+    def _has_goto_target(self, block: Block) -> bool:
+        first = self.program[block.start].line_number
+        last = self.program[block.end - 1].line_number
+        return any(first <= target <= last for target in self.goto_targets)
+
+    @staticmethod
+    def _placeholder(instr: Instruction) -> Instruction:
+        """An empty line standing in for a removed line, so gotos to it still resolve"""
+        return Instruction('empty', 0, '', instr.line_number, instr.source)
+
+    @staticmethod
+    def _constant_condition(instr: Instruction) -> Any:
+        if instr.kind not in ('if', 'while') or instr.expr is None:
+            return NO_CONSTANT
+        node = instr.expr.node
+        return node.value if isinstance(node, ast.Constant) else NO_CONSTANT
+
+    def _optimize_instruction(self, instr: Instruction) -> Instruction:
+        """Fold the expressions of an instruction, copying it when something changed"""
+        kind = instr.kind
+        expr = instr.expr
+        operands = instr.operands
+
+        if kind in ('assign', 'item_assign', 'if', 'while', 'for', 'expr', 'array_access') and expr is not None:
+            expr = self._fold_parsed(expr, instr.line_number)
+
+        elif kind == 'print':
+            chunks = []
+            for tokens in operands:
+                folded_tokens = []
+                for literal, token, parsed in tokens:
+                    if literal is None and parsed is not None:
+                        parsed = self._fold_parsed(parsed, instr.line_number)
+                        if isinstance(parsed.node, ast.Constant):
+                            literal, token, parsed = str(parsed.node.value), None, None
+                    if literal is not None:
+                        literal = self.pool.intern(literal)
+                    folded_tokens.append((literal, token, parsed))
+                chunks.append(tuple(folded_tokens))
+            operands = tuple(chunks)
+
+        elif kind == 'call':
+            func_name, arguments = operands
+            folded_arguments = []
+            for source, literal, parsed in arguments:
+                if literal is NO_CONSTANT and parsed is not None:
+                    parsed = self._fold_parsed(parsed, instr.line_number)
+                    if isinstance(parsed.node, ast.Constant):
+                        literal = parsed.node.value
+                if literal is not NO_CONSTANT:
+                    literal = self.pool.intern(literal)
+                folded_arguments.append((source, literal, parsed))
+            operands = (func_name, tuple(folded_arguments))
+
+        if expr is instr.expr and operands == instr.operands:
+            return instr
+        optimized = Instruction(kind, instr.indent, instr.code, instr.line_number, instr.source,
+                                operands, expr)
+        optimized.target = instr.target
+        return optimized
+
+    def _fold_parsed(self, parsed: ParsedExpression, line_number: int) -> ParsedExpression:
+        """Fold a parsed expression, keeping the original when nothing could be folded"""
+        try:
+            node = parsed.node
+        except SyntaxError:
+            return parsed
+        folded = self._fold(node)
+        if folded is node:
+            return parsed
+        if not isinstance(node, ast.Constant):
+            self.folded += 1
+            self.notes.append(f"[Line {line_number}] folded {parsed.source} -> {ast.unparse(folded)}")
+        return ParsedExpression(parsed.source, folded)
+
+    def _constant(self, value: Any, node: ast.AST) -> ast.Constant:
+        return ast.copy_location(ast.Constant(self.pool.intern(value)), node)
+
+    def _fold(self, node: ast.AST) -> ast.AST:
+        """Fold constant sub-expressions the evaluator supports, errors are left for run time"""
+        if isinstance(node, ast.Constant):
+            value = self.pool.intern(node.value)
+            return node if value is node.value else self._constant(value, node)
+
+        if isinstance(node, ast.Name):
+            if node.id in PURE_CONSTANTS:
+                return self._constant(SAFE_FUNCTIONS[node.id], node)
+            return node
+
+        if isinstance(node, ast.BinOp):
+            left = self._fold(node.left)
+            right = self._fold(node.right)
+            op_name = type(node.op).__name__
+            if isinstance(left, ast.Constant) and isinstance(right, ast.Constant) \
+                    and op_name in BINARY_OPERATORS and not _too_large(op_name, left.value, right.value):
+                value = self._evaluate(SAFE_OPERATIONS[BINARY_OPERATORS[op_name]], left.value, right.value)
+                if value is not NO_CONSTANT:
+                    return self._constant(value, node)
+            if left is node.left and right is node.right:
+                return node
+            return ast.copy_location(ast.BinOp(left, node.op, right), node)
+
+        if isinstance(node, ast.Compare):
+            left = self._fold(node.left)
+            comparators = [self._fold(comparator) for comparator in node.comparators]
+            op_names = [type(op).__name__ for op in node.ops]
+            if isinstance(left, ast.Constant) and all(isinstance(c, ast.Constant) for c in comparators) \
+                    and all(name in COMPARE_OPERATORS for name in op_names):
+                # Chained comparisons combine like the evaluator does
+                result = True
+                current = left.value
+                for op_name, comparator in zip(op_names, comparators):
+                    value = self._evaluate(SAFE_OPERATIONS[COMPARE_OPERATORS[op_name]],
+                                           current, comparator.value)
+                    if value is NO_CONSTANT:
+                        break
+                    result = result and value
+                    current = comparator.value
+                else:
+                    if _foldable_size(result):
+                        return self._constant(result, node)
+            if left is node.left and all(a is b for a, b in zip(comparators, node.comparators)):
+                return node
+            return ast.copy_location(ast.Compare(left, node.ops, comparators), node)
+
+        if isinstance(node, ast.Call):
+            args = [self._fold(arg) for arg in node.args]
+            if isinstance(node.func, ast.Name) and node.func.id in PURE_FUNCTIONS and not node.keywords \
+                    and all(isinstance(arg, ast.Constant) for arg in args):
+                value = self._evaluate(SAFE_FUNCTIONS[node.func.id], *[arg.value for arg in args])
+                if value is not NO_CONSTANT:
+                    return self._constant(value, node)
+            if all(a is b for a, b in zip(args, node.args)):
+                return node
+            return ast.copy_location(ast.Call(node.func, args, node.keywords), node)
+
+        return node
+
+    @staticmethod
+    def _evaluate(func, *args) -> Any:
+        """Run a pure operation, giving NO_CONSTANT when it fails or its result is too large"""
+        try:
+            value = func(*args)
+        except Exception:
+            return NO_CONSTANT
+        return value if _foldable_size(value) else NO_CONSTANT
+
@@ -0,0 +1,88 @@
+import sys
+from typing import Any, List, Optional, TextIO, Union
+
+from .constants import OUTPUT_BUFFER_SIZE
+from .errors import GuythonRuntimeError
+
+
+class OutputSink:
+    """Where program output goes, block-buffered unless it is written to a terminal
+
+    By default output goes to whatever sys.stdout is when it is flushed. It
+    can be redirected to a file path, which the sink opens and owns, or to
+    any object with a write method such as io.StringIO.
+    """
+
+    def __init__(self, target: Union[None, str, TextIO] = None, buffer_size: int = OUTPUT_BUFFER_SIZE):
+        self.buffer_size = buffer_size
+        self._parts: List[str] = []
+        self._size = 0
+        self._stream: Optional[TextIO] = None  # None follows sys.stdout
+        self._owned = False
+        # Whether the stream last checked is a terminal, output to one is written a line at a time
+        self._checked_stream: Any = None
+        self._interactive = False
+        self.redirect(target)
+
+    @property
+    def stream(self) -> TextIO:
+        """The stream output is written to"""
+        return self._stream if self._stream is not None else sys.stdout
+
+    def redirect(self, target: Union[None, str, TextIO] = None):
+        """Send output to stdout (None), a file path or a writable stream, flushing what is buffered"""
+        if target is not None and not isinstance(target, str) and not hasattr(target, 'write'):
+            raise GuythonRuntimeError(f"Cannot send output to value of type {type(target).__name__}")
+        self.flush()
+        self._close_owned()
+        if isinstance(target, str):
+            try:
+                target = open(target, 'w', encoding='utf-8')
+            except OSError as e:
+                raise GuythonRuntimeError(f"Cannot open output file {target}: {e}")
+            self._owned = True
+        self._stream = target
+        self._checked_stream = None
+
+    def write(self, text: str):
+        """Queue text, writing it out once a block has built up or at once on a terminal"""
+        self._parts.append(text)
+        self._size += len(text)
+        if self._size >= self.buffer_size or self._is_interactive():
+            self.flush()
+
+    def print(self, *values: Any, sep: str = ' ', end: str = '\n'):
+        """Write values like the print built-in"""
+        self.write(sep.join(map(str, values)) + end)
+
+    def flush(self):
+        """Write out everything buffered"""
+        if not self._parts:
+            return
+        text = ''.join(self._parts)
+        self._parts.clear()
+        self._size = 0
+        stream = self.stream
+        stream.write(text)
+        if hasattr(stream, 'flush'):
+            stream.flush()
+
+    def close(self):
+        """Flush, closing a file the sink opened itself, and go back to stdout"""
+        self.redirect(None)
+
+    def _is_interactive(self) -> bool:
+        stream = self.stream
+        if stream is not self._checked_stream:
+            isatty = getattr(stream, 'isatty', None)
+            try:
+                self._interactive = bool(isatty and isatty())
+            except ValueError:  # A closed stream
+                self._interactive = False
+            self._checked_stream = stream
+        return self._interactive
+
+    def _close_owned(self):
+        if self._owned:
+            self._stream.close()
+            self._owned = False
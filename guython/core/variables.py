@@ -0,0 +1,107 @@
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterator, List, Optional
+
+UNSET = object()  # Marks a slot that holds no variable
+
+
+class SymbolTable:
+    """Process-wide mapping of variable names to slot indices"""
+
+    def __init__(self):
+        self.indices: Dict[str, int] = {}
+        self.names: List[str] = []
+
+    def slot(self, name: str) -> int:
+        """Get the slot of a name, giving new names the next free slot"""
+        slot = self.indices.get(name)
+        if slot is None:
+            slot = self.indices[name] = len(self.names)
+            self.names.append(name)
+        return slot
+
+    def find(self, name: str) -> Optional[int]:
+        """Get the slot of a name without creating one"""
+        return self.indices.get(name)
+
+
+symbols = SymbolTable()
+
+
+class Frame:
+    """Call frame of a running Guython function, holding its parameters by slot"""
+
+    __slots__ = ('name', 'locals', 'parent')
+
+    def __init__(self, name: str, locals: Dict[int, Any], parent: Optional['Frame'] = None):
+        self.name = name
+        self.locals = locals
+        self.parent = parent
+
+    def __repr__(self):
+        return f"Frame({self.name!r})"
+
+
+class VariableStore(MutableMapping):
+    """Variables kept in a list indexed by symbol slot, usable as a dict"""
+
+    __slots__ = ('cells', '_count')
+
+    def __init__(self, variables: Optional[Dict[str, Any]] = None):
+        self.cells: List[Any] = []
+        self._count = 0
+        if variables:
+            self.update(variables)
+
+    def load(self, slot: int) -> Any:
+        """Get the value in a slot, or UNSET"""
+        cells = self.cells
+        return cells[slot] if slot < len(cells) else UNSET
+
+    def store(self, slot: int, value: Any):
+        """Set the value in a slot, growing the cells when needed"""
+        cells = self.cells
+        if slot >= len(cells):
+            cells.extend([UNSET] * (slot + 1 - len(cells)))
+        if cells[slot] is UNSET:
+            self._count += 1
+        cells[slot] = value
+
+    def __getitem__(self, name: str) -> Any:
+        slot = symbols.find(name)
+        value = UNSET if slot is None else self.load(slot)
+        if value is UNSET:
+            raise KeyError(name)
+        return value
+
+    def __setitem__(self, name: str, value: Any):
+        self.store(symbols.slot(name), value)
+
+    def __delitem__(self, name: str):
+        slot = symbols.find(name)
+        if slot is None or self.load(slot) is UNSET:
+            raise KeyError(name)
+        self.cells[slot] = UNSET
+        self._count -= 1
+
+    def __contains__(self, name: object) -> bool:
+        slot = symbols.indices.get(name) if isinstance(name, str) else None
+        return slot is not None and self.load(slot) is not UNSET
+
+    def __iter__(self) -> Iterator[str]:
+        names = symbols.names
+        for slot, value in enumerate(self.cells):
+            if value is not UNSET:
+                yield names[slot]
+
+    def __len__(self) -> int:
+        return self._count
+
+    def copy(self) -> 'VariableStore':
+        """Copy the store, the values themselves are shared"""
+        store = VariableStore()
+        store.cells = list(self.cells)
+        store._count = self._count
+        return store
+
+    def __repr__(self):
+        return f"VariableStore({dict(self)!r})"
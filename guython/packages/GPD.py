@@ -38,6 +38,16 @@ class GPD:
         self.package_index = self._load_index()
         
     
+    def _print(self, *values, sep=' ', end='\n', file=None, flush=False):
+        """Print through the interpreter's output, so messages keep their place among the program's"""
+        output = getattr(self.interpreter, 'output', None)
+        if output is None or file is not None:
+            print(*values, sep=sep, end=end, file=file, flush=flush)
+        else:
+            output.print(*values, sep=' ' if sep is None else sep, end='\n' if end is None else end)
+            if flush:
+                output.flush()
+
     def _get_package_language(self, pkg_name: str) -> str:
         """Fetch manifest.gy from GitHub to determine package language"""
         manifest_url = urljoin(self.raw_base, f"{pkg_name}/manifest.gy")
@@ -79,7 +89,7 @@ class GPD:
         """Install a package from the GPD repository"""
         try:
             if pkg_name in self.package_index:
-                print(f"Package {pkg_name} is already installed")
+                self._print(f"Package {pkg_name} is already installed")
                 return
     
             # Get package metadata
@@ -125,9 +135,9 @@ class GPD:
                     with open(dest_path, 'wb') as f:
                         f.write(response.content)
                     downloaded_files.append(file_path)
-                    print(f"✓ Downloaded: {file_path}")
+                    self._print(f"✓ Downloaded: {file_path}")
                 except requests.RequestException as e:
-                    print(f"Warning: Failed to download {file_path}: {str(e)}")
+                    self._print(f"Warning: Failed to download {file_path}: {str(e)}")
     
             # 5. Find the main file
             main_base = pkg_data.get('main', 'main')
@@ -170,8 +180,8 @@ class GPD:
             }
             self._save_index()
             
-            print(f"✓ Successfully installed {pkg_name} v{pkg_data['version']}")
-            print(f"Main file: {main_file}")
+            self._print(f"✓ Successfully installed {pkg_name} v{pkg_data['version']}")
+            self._print(f"Main file: {main_file}")
             
         except Exception as e:
             if 'pkg_dir' in locals() and os.path.exists(pkg_dir):
@@ -200,14 +210,14 @@ class GPD:
             if found_files:
                 main_file = found_files[0]
                 main_path = os.path.join(pkg_dir, main_file)
-                print(f"Warning: Using {main_file} instead of {main_base}{ext}")
+                self._print(f"Warning: Using {main_file} instead of {main_base}{ext}")
             else:
                 # Try to find any .py or .gy file as last resort
                 all_files = [f for f in os.listdir(pkg_dir) if f.endswith('.py') or f.endswith('.gy')]
                 if all_files:
                     main_file = all_files[0]
                     main_path = os.path.join(pkg_dir, main_file)
-                    print(f"Warning: Using {main_file} as no main file found")
+                    self._print(f"Warning: Using {main_file} as no main file found")
                 else:
                     raise GuythonRuntimeError(f"No main file found in package {pkg_name}")
 
@@ -255,7 +265,7 @@ class GPD:
                     'set': set,
                     'len': len,
                     'range': range,
-                    'print': print,
+                    'print': self._print,  # Package output goes where the program's does
                     'min': min,
                     'max': max,
                     'sum': sum,
@@ -311,13 +321,27 @@ class GPD:
             # Add to Guython variables
             var_name = alias or pkg_name
             self.interpreter.variables[var_name] = module
+
+            # Let the package add its own statements, e.g. GUYTHON_STATEMENTS = {'shout': shout}
+            statements = getattr(module, 'GUYTHON_STATEMENTS', None)
+            if statements and hasattr(self.interpreter, 'register_statement'):
+                for word, func in statements.items():
+                    self.interpreter.register_statement(word, self._statement_handler(func))
             
-            print(f"Imported Python package: {pkg_name}")
-            print(f"Available functions: {[attr for attr in dir(module) if not attr.startswith('_')]}")
+            self._print(f"Imported Python package: {pkg_name}")
+            self._print(f"Available functions: {[attr for attr in dir(module) if not attr.startswith('_')]}")
             return module
         except Exception as e:
             raise GuythonRuntimeError(f"Error importing Python package: {e}")
     
+    def _statement_handler(self, func):
+        """Wrap a package function so it runs with the text after its keyword"""
+        def handler(instr, importing):
+            result = func(instr.operands[0])
+            if result is not None and not importing:
+                self._print(result)
+        return handler
+
     def _import_guython_package(self, pkg_name: str, gy_path: str, alias: Optional[str] = None):
         """Import a Guython package"""
         try:
@@ -339,7 +363,7 @@ class GPD:
                 # Restore original variables
                 self.interpreter.variables = old_vars
                 
-            print(f"Imported Guython package: {pkg_name}")
+            self._print(f"Imported Guython package: {pkg_name}")
         except Exception as e:
             raise GuythonRuntimeError(f"Import failed: {str(e)}")
     
@@ -355,7 +379,7 @@ class GPD:
         """Remove an installed package"""
         try:
             if pkg_name not in self.package_index:
-                print(f"Package not installed: {pkg_name}")
+                self._print(f"Package not installed: {pkg_name}")
                 return
             
             pkg_dir = os.path.join(self.local_pkg_dir, pkg_name)
@@ -372,7 +396,7 @@ class GPD:
             # Update index
             del self.package_index[pkg_name]
             self._save_index()
-            print(f"Successfully uninstalled {pkg_name}")
+            self._print(f"Successfully uninstalled {pkg_name}")
         except Exception as e:
             raise GuythonRuntimeError(f"Uninstall failed: {str(e)}")
 
@@ -380,7 +404,7 @@ class GPD:
         try:
             remote_index = self._fetch_remote_index()
         except GuythonRuntimeError as e:
-            print(f"Could not fetch remote index: {e}")
+            self._print(f"Could not fetch remote index: {e}")
             return
     
         updates_found = False
@@ -388,41 +412,41 @@ class GPD:
             current_version = data.get('version', '0.0.0')
             remote_version = remote_index.get(pkg, {}).get('version')
             if remote_version is None:
-                print(f"{pkg}: Not found in remote repository")
+                self._print(f"{pkg}: Not found in remote repository")
                 continue
             
             if remote_version != current_version:
-                print(f"{pkg}: {current_version} -> {remote_version} (Update available)")
+                self._print(f"{pkg}: {current_version} -> {remote_version} (Update available)")
                 updates_found = True
             else:
-                print(f"{pkg}: {current_version} (Up to date)")
+                self._print(f"{pkg}: {current_version} (Up to date)")
     
         if not updates_found:
-            print("All packages are up to date.")
+            self._print("All packages are up to date.")
 
     def update_package(self, pkg_name: str):
         if pkg_name not in self.package_index:
-            print(f"Package '{pkg_name}' is not installed.")
+            self._print(f"Package '{pkg_name}' is not installed.")
             return
 
         try:
             remote_index = self._fetch_remote_index()
         except GuythonRuntimeError as e:
-            print(f"Could not fetch remote index: {e}")
+            self._print(f"Could not fetch remote index: {e}")
             return
 
         current_version = self.package_index[pkg_name].get('version', '0.0.0')
         remote_version = remote_index.get(pkg_name, {}).get('version')
 
         if remote_version is None:
-            print(f"Package '{pkg_name}' not found in remote repository.")
+            self._print(f"Package '{pkg_name}' not found in remote repository.")
             return
 
         if current_version == remote_version:
-            print(f"'{pkg_name}' is already up to date.")
+            self._print(f"'{pkg_name}' is already up to date.")
             return
 
-        print(f"Updating '{pkg_name}' from {current_version} to {remote_version}...")
+        self._print(f"Updating '{pkg_name}' from {current_version} to {remote_version}...")
 
         # Remove old files
         pkg_dir = os.path.join(self.local_pkg_dir, pkg_name)
@@ -441,6 +465,6 @@ class GPD:
             self.package_index[pkg_name]['version'] = new_data.get('version', remote_version)
             self._save_index()
 
-            print(f"'{pkg_name}' updated successfully.")
+            self._print(f"'{pkg_name}' updated successfully.")
         except GuythonRuntimeError as e:
-            print(f"Update failed: {e}")
+            self._print(f"Update failed: {e}")
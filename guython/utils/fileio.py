@@ -1,3 +1,508 @@
+import array
+import mmap
 import os
-from .../core.constants import SAFE_FUNCTIONS  # if needed
-from .../core.errors import GuythonRuntimeError
+import re
+import sys
+import tempfile
+import weakref
+from collections import OrderedDict
+from collections.abc import Sequence
+from itertools import accumulate, islice
+from stat import S_IMODE
+from typing import Any, Callable, Dict, Iterator, List, Optional, TextIO, Tuple
+
+from ..core.constants import MMAP_THRESHOLD, READ_CHUNK_SIZE, WRITE_BUFFER_SIZE, WRITE_POOL_SIZE, WRITE_SYNC
+from ..core.errors import GuythonRuntimeError
+
+# When written files are fsynced: never, when the pool is flushed or closed, or after every write
+SYNC_MODES = ('none', 'batch', 'always')
+
+# Bytes of a file scanned at a time when indexing its lines
+_INDEX_BLOCK_SIZE = 1 << 20
+
+# Characters that make a grep pattern a regular expression rather than plain text
+_REGEX_CHARACTERS = re.compile(r'[.^$*+?{}\[\]\\|()]')
+
+
+def stream_text(path: str, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[str]:
+    """Read a text file a chunk at a time"""
+    with open(path, 'r', encoding='utf-8') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def iter_lines(path: str) -> Iterator[Tuple[int, str]]:
+    """Numbered lines of a text file, without their newlines, read as they are needed"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for number, line in enumerate(f, 1):
+            yield number, line.rstrip('\n')
+
+
+def head_lines(path: str, count: int) -> Iterator[Tuple[int, str]]:
+    """The first count lines, the rest of the file is never read"""
+    return islice(iter_lines(path), count)
+
+
+def range_lines(path: str, first: Optional[int], last: Optional[int]) -> Iterator[Tuple[int, str]]:
+    """Lines first to last, counted from 1 and both included, reading stops after the last"""
+    first = max(first or 1, 1)
+    return islice(iter_lines(path), first - 1, last)
+
+
+def tail_lines(path: str, count: int, chunk_size: int = READ_CHUNK_SIZE) -> Tuple[int, List[str]]:
+    """The last count lines, found by reading blocks backwards from the end
+
+    Returns the offset of the first of those lines along with them, its line
+    number is only worked out when it is asked for.
+    """
+    if count <= 0:
+        return os.path.getsize(path), []
+    with open(path, 'rb') as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        tail = b''
+        # A newline closing the last line doesn't start another one
+        wanted = count + 1 if end and _last_byte(f, end) == b'\n' else count
+        while position > 0:
+            step = min(chunk_size, position)
+            position -= step
+            f.seek(position)
+            tail = f.read(step) + tail
+            if tail.count(b'\n') >= wanted:
+                break
+        cut = len(tail)
+        for _ in range(wanted):
+            cut = tail.rfind(b'\n', 0, cut)
+            if cut == -1:
+                break
+        start = cut + 1  # 0 when the file has no more lines than asked for
+        text = tail[start:].decode('utf-8').replace('\r\n', '\n')
+    lines = text.split('\n') if text else []
+    if text.endswith('\n'):
+        lines.pop()
+    return position + start, lines
+
+
+def count_lines_before(path: str, offset: int, chunk_size: int = READ_CHUNK_SIZE) -> int:
+    """Count the newlines before a byte offset, a block at a time"""
+    total = 0
+    with open(path, 'rb') as f:
+        while offset > 0:
+            block = f.read(min(chunk_size, offset))
+            if not block:
+                break
+            total += block.count(b'\n')
+            offset -= len(block)
+    return total
+
+
+def compile_pattern(pattern: str):
+    """Compile a grep pattern"""
+    try:
+        return re.compile(pattern)
+    except re.error as e:
+        raise GuythonRuntimeError(f"Invalid grep pattern '{pattern}': {e}")
+
+
+def grep_lines(path: str, pattern: str, lines: Optional[Iterator[Tuple[int, str]]] = None,
+               chunk_size: int = READ_CHUNK_SIZE) -> Iterator[Tuple[int, str]]:
+    """Numbered lines matching a regular expression, from the given lines or the whole file
+
+    Plain text patterns over a whole large file are found with a memory map,
+    so only the lines around matches are ever decoded.
+    """
+    if lines is None and not _REGEX_CHARACTERS.search(pattern) and os.path.getsize(path) >= MMAP_THRESHOLD:
+        return _find_lines(path, pattern.encode('utf-8'), chunk_size)
+    regex = compile_pattern(pattern)
+    if lines is None:
+        lines = iter_lines(path)
+    return ((number, line) for number, line in lines if regex.search(line))
+
+
+def _find_lines(path: str, needle: bytes, chunk_size: int) -> Iterator[Tuple[int, str]]:
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        size = len(data)
+        number = 1
+        counted = 0  # Newlines before this offset are in number
+        position = data.find(needle) if needle else 0
+        while position != -1 and position < size:
+            start = data.rfind(b'\n', 0, position) + 1
+            end = data.find(b'\n', position)
+            if end == -1:
+                end = size
+            for block in range(counted, start, chunk_size):
+                number += data[block:min(block + chunk_size, start)].count(b'\n')
+            counted = start
+            yield number, data[start:end].decode('utf-8').rstrip('\r')
+            position = data.find(needle, end + 1)
+
+
+def _last_byte(f, end: int) -> bytes:
+    f.seek(end - 1)
+    return f.read(1)
+
+
+class LineFile(Sequence):
+    """The lines of a text file as a lazy sequence, without their newlines
+
+    Looping reads the file a line at a time. Indexing records where each
+    line starts as far as the highest index asked for, so later lookups
+    read just that line at its recorded position. Pending appends of the
+    write pool are flushed first and lines appended since are indexed too.
+    The pool closes the file when it replaces it, so the new contents are
+    indexed from the start, while a line that some other program cut from
+    the file is a runtime error.
+    """
+
+    __slots__ = ('path', '_files', '_file', '_size', '_offsets', '_indexed', '__weakref__')
+    __hash__ = None
+
+    def __init__(self, path: str, files: Optional['WritePool'] = None):
+        self.path = path
+        self._files = files  # The write pool whose appends are part of the file
+        self._file = None  # Opened on first index
+        self._size = 0  # Size of the file as far as it has been indexed
+        self._offsets = array.array('q', [0])  # Start of each line found so far
+        self._indexed = False  # Whether every line start is in _offsets
+
+    def __iter__(self) -> Iterator[str]:
+        if self._files is not None:
+            self._files.flush(self.path)
+        with open(self.path, 'r', encoding='utf-8', newline='\n') as f:
+            for line in f:
+                yield line.rstrip('\n').rstrip('\r')
+
+    def __len__(self):
+        self._index(sys.maxsize)
+        return len(self._offsets)
+
+    def __getitem__(self, index: Any) -> Any:
+        if isinstance(index, slice):
+            return [self[i] for i in range(len(self))[index]]
+        if index < 0:
+            index += len(self)
+        self._index(index + 1)  # Where the next line starts is where this one ends
+        if index < 0 or index >= len(self._offsets):
+            raise IndexError("line index out of range")
+        start = self._offsets[index]
+        end = self._offsets[index + 1] if index + 1 < len(self._offsets) else self._size
+        line = self._read(start, end - start)
+        if len(line) < end - start:
+            raise GuythonRuntimeError(f"Line {index} of {self.path} is past the end of the file, "
+                                      f"it was changed after its lines were read")
+        return _decode_line(line)
+
+    def __setitem__(self, index: Any, value: Any):
+        raise GuythonRuntimeError(f"Lines read from {self.path} can't be assigned")
+
+    def _index(self, index: int):
+        """Record line starts until line index is known or the file ends"""
+        self._open()
+        offsets = self._offsets
+        size = self._size
+        while not self._indexed and len(offsets) <= index:
+            start = offsets[-1]
+            block = self._read(start, min(_INDEX_BLOCK_SIZE, size - start))
+            cut = block.rfind(b'\n')
+            if cut == -1:
+                block = bytearray(block)  # Grown in place while the line goes on
+            while cut == -1 and start + len(block) < size:
+                # A line longer than a block
+                more = self._read(start + len(block), min(_INDEX_BLOCK_SIZE, size - start - len(block)))
+                if not more:
+                    break
+                cut = more.find(b'\n')
+                if cut != -1:
+                    cut += len(block)
+                block += more
+            if cut == -1:
+                self._indexed = True
+                break
+            # Each line of the block starts one past the newline before it
+            lengths = (len(line) + 1 for line in block[:cut].split(b'\n'))
+            offsets.extend(islice(accumulate(lengths, initial=start), 1, None))
+            if offsets[-1] == size:
+                # The file ends with a newline, which doesn't start another line
+                offsets.pop()
+                self._indexed = True
+
+    def _open(self):
+        """Open the file on first use and pick up what was appended since it was indexed"""
+        files = self._files
+        if files is not None:
+            files.flush(self.path)
+        if self._file is None:
+            self._file = open(self.path, 'rb', buffering=0)
+            if files is not None:
+                files.attach(self)
+        size = os.fstat(self._file.fileno()).st_size
+        if size > self._size:
+            # The last line found may go on, so indexing starts again from it
+            if not self._offsets:
+                self._offsets.append(0)
+            self._size = size
+            self._indexed = False
+        elif not size:
+            # An empty file has no lines at all
+            self._offsets = array.array('q')
+            self._indexed = True
+
+    def _read(self, start: int, size: int) -> bytes:
+        """Up to size bytes from start, fewer when the file has since been cut short"""
+        self._file.seek(start)
+        return self._file.read(size)
+
+    def close(self):
+        """Close the file, it is opened and indexed again from the start on the next index"""
+        if self._file is not None:
+            self._file.close()
+        self._file = None
+        self._size = 0
+        self._offsets = array.array('q', [0])
+        self._indexed = False
+
+    def __str__(self):
+        return f"<lines of {self.path}>"
+
+    def __repr__(self):
+        return f"LineFile({self.path!r})"
+
+
+def _decode_line(line: bytes) -> str:
+    """Decode a line of a file, dropping its newline the way looping over the lines does"""
+    return line.rstrip(b'\n').rstrip(b'\r').decode('utf-8')
+
+
+class CommentStripper:
+    """Removes {comments} from text fed in chunks, matching strip_comments over the whole text
+
+    A comment may span chunks. Like strip_comments, an unclosed comment
+    drops the rest of the text and the result has no surrounding whitespace.
+    """
+
+    def __init__(self):
+        self.in_comment = False
+        self.started = False
+        self.trailing = ''  # Whitespace held back until something follows it, dropped at the end
+
+    def feed(self, chunk: str) -> str:
+        """Strip a chunk, returning the text that is ready to be written"""
+        kept = []
+        position = 0
+        while position < len(chunk):
+            if self.in_comment:
+                end = chunk.find('}', position)
+                if end == -1:
+                    return self._ready(kept)
+                self.in_comment = False
+                position = end + 1
+            else:
+                start = chunk.find('{', position)
+                if start == -1:
+                    kept.append(chunk[position:])
+                    break
+                kept.append(chunk[position:start])
+                self.in_comment = True
+                position = start + 1
+        return self._ready(kept)
+
+    def _ready(self, kept: List[str]) -> str:
+        text = ''.join(kept)
+        if not self.started:
+            text = text.lstrip()
+            if not text:
+                return ''
+            self.started = True
+        text = self.trailing + text
+        stripped = text.rstrip()
+        self.trailing = text[len(stripped):]
+        return stripped
+
+
+def has_content(path: str, size: int, chunk_size: int = READ_CHUNK_SIZE) -> bool:
+    """Check whether a file of the given size holds anything but whitespace
+
+    An empty file is known from its size alone, otherwise reading stops at
+    the first character that isn't whitespace.
+    """
+    if not size:
+        return False
+    for chunk in stream_text(path, chunk_size):
+        if not chunk.isspace():
+            return True
+    return False
+
+
+def replace_file(path: str, write: Callable[[TextIO], None], atomic: bool = False,
+                 permissions: Optional[int] = None, sync: str = WRITE_SYNC):
+    """Replace a file's contents with what write writes to the open file, in place or atomically"""
+    if atomic:
+        _replace_atomic(path, write, permissions, sync_directory=sync != 'none')
+        return
+    with open(path, 'w', encoding='utf-8') as f:
+        write(f)
+        if sync != 'none':
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def _replace_atomic(path: str, write: Callable[[TextIO], None], permissions: Optional[int] = None,
+                    sync_directory: bool = False):
+    """Replace a file by writing a temp file next to it, syncing it and renaming it into place
+
+    Readers see either the old or the new contents, never part of a write.
+    The new file gets the given permissions, or keeps those of the file it
+    replaces. Syncing the directory as well makes the rename itself durable.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    if permissions is None:
+        try:
+            permissions = S_IMODE(os.stat(path).st_mode)
+        except FileNotFoundError:
+            permissions = 0o666 & ~_umask()
+    fd, temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(temp_path, permissions)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+    if sync_directory and hasattr(os, 'O_DIRECTORY'):
+        directory_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(directory_fd)
+        finally:
+            os.close(directory_fd)
+
+
+def _umask() -> int:
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+class WritePool:
+    """Open append handles kept between writes, so writing in a loop doesn't reopen the file
+
+    Handles are buffered and the least recently used one is closed once more
+    than max_handles are open. Pending writes reach the files when the pool
+    is flushed or closed.
+    """
+
+    def __init__(self, max_handles: int = WRITE_POOL_SIZE, buffer_size: int = WRITE_BUFFER_SIZE,
+                 sync: str = WRITE_SYNC):
+        self.max_handles = max_handles
+        self.buffer_size = buffer_size
+        self.sync = sync
+        self._handles: 'OrderedDict[str, TextIO]' = OrderedDict()
+        self._unsynced = set()  # Paths written since their last fsync, in batch mode
+        # LineFiles holding each file open, by id as they aren't hashable
+        self._readers: Dict[str, weakref.WeakValueDictionary] = {}
+
+    def configure(self, max_handles: Optional[int] = None, buffer_size: Optional[int] = None,
+                  sync: Optional[str] = None):
+        """Change the pool settings, open handles are closed so new ones use them"""
+        if sync is not None and sync not in SYNC_MODES:
+            raise GuythonRuntimeError(f"Unknown sync mode: {sync} (expected one of {', '.join(SYNC_MODES)})")
+        for name, value in (('handle count', max_handles), ('buffer size', buffer_size)):
+            if value is not None and value < 1:
+                raise GuythonRuntimeError(f"Write {name} must be at least 1")
+        self.close()
+        if max_handles is not None:
+            self.max_handles = max_handles
+        if buffer_size is not None:
+            self.buffer_size = buffer_size
+        if sync is not None:
+            self.sync = sync
+
+    def append(self, path: str, text: str):
+        """Append text to a file through its pooled handle"""
+        key = os.path.abspath(path)
+        handle = self._handles.get(key)
+        if handle is None:
+            handle = self._open(key)
+        else:
+            self._handles.move_to_end(key)
+        handle.write(text)
+        if self.sync == 'always':
+            handle.flush()
+            os.fsync(handle.fileno())
+        elif self.sync == 'batch':
+            self._unsynced.add(key)
+
+    def write(self, path: str, text: str, atomic: bool = False, permissions: Optional[int] = None):
+        """Replace a file's contents with text"""
+        self.replace(path, lambda f: f.write(text), atomic, permissions)
+
+    def replace(self, path: str, write: Callable[[TextIO], None], atomic: bool = False,
+                permissions: Optional[int] = None):
+        """Replace a file's contents, closing its pooled handle first so earlier appends land before
+
+        LineFiles reading the file are closed too, an open file can't be
+        replaced on Windows and their lines would be those of the old file.
+        """
+        self.close(path)
+        self._close_readers(os.path.abspath(path))
+        replace_file(path, write, atomic, permissions, self.sync)
+
+    def attach(self, reader: 'LineFile'):
+        """Track a LineFile that holds its file open, it is closed when the file is replaced"""
+        self._readers.setdefault(os.path.abspath(reader.path), weakref.WeakValueDictionary())[id(reader)] = reader
+
+    def flush(self, path: Optional[str] = None):
+        """Write out pending appends of one file or of all of them"""
+        if path is not None:
+            if self._handles:  # Nothing to look up otherwise, LineFiles ask before every read
+                key = os.path.abspath(path)
+                handle = self._handles.get(key)
+                if handle is not None:
+                    self._flush_handle(key, handle)
+            return
+        for key, handle in self._handles.items():
+            self._flush_handle(key, handle)
+
+    def close(self, path: Optional[str] = None):
+        """Flush and close the handle of one file or all of them, all of them closes LineFiles too"""
+        keys = [os.path.abspath(path)] if path is not None else list(self._handles)
+        for key in keys:
+            handle = self._handles.pop(key, None)
+            if handle is not None:
+                try:
+                    self._flush_handle(key, handle)
+                finally:
+                    handle.close()
+        if path is None:
+            for key in list(self._readers):
+                self._close_readers(key)
+
+    def _close_readers(self, key: str):
+        readers = self._readers.pop(key, None)
+        if readers is not None:
+            for reader in list(readers.values()):
+                reader.close()
+
+    def _open(self, key: str) -> TextIO:
+        while len(self._handles) >= self.max_handles:
+            self.close(next(iter(self._handles)))
+        handle = open(key, 'a', encoding='utf-8', buffering=self.buffer_size)
+        self._handles[key] = handle
+        return handle
+
+    def _flush_handle(self, key: str, handle: TextIO):
+        handle.flush()
+        if key in self._unsynced:
+            os.fsync(handle.fileno())
+            self._unsynced.discard(key)
+
+    def __len__(self):
+        return len(self._handles)
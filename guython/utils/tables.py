@@ -0,0 +1,307 @@
+import csv
+import gc
+import json
+import re
+from contextlib import contextmanager
+from itertools import islice, zip_longest
+from operator import itemgetter
+from typing import Any, Callable, Iterator, List, Optional, Sequence, TextIO
+
+from ..core.arrays import SEQUENCE_TYPES, NumericArray
+from ..core.constants import READ_CHUNK_SIZE
+from ..core.errors import GuythonRuntimeError
+from .fileio import stream_text
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_ARRAY_SEPARATOR = re.compile(r'[ \t\n\r]*([,\]])[ \t\n\r]*')
+_VALUE_SEPARATOR = re.compile(r'[ \t\n\r]+|\Z')
+# A CSV field that is an int or a float
+_NUMBER = re.compile(r'\s*[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?\s*')
+
+
+@contextmanager
+def _collection_paused():
+    """Pause the cycle collector, which would otherwise run over and over while a table is built
+
+    Rows and fields can't form reference cycles, so nothing is left for it.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def parse_columns(text: str) -> List[str]:
+    """Split a -columns value such as 'name,age' or '0,2'"""
+    columns = [column.strip() for column in text.split(',')]
+    if not all(columns):
+        raise GuythonRuntimeError(f"Invalid column list: '{text}'")
+    return columns
+
+
+def load_csv(path: str, columns: Optional[List[str]] = None, rows: Optional[int] = None,
+             header: bool = False, by_column: bool = False) -> List[Any]:
+    """Load a CSV file as a list of rows, or of columns with by_column
+
+    Columns are picked by header name or by index, only their fields are
+    kept and reading stops after rows rows. Fields are converted a column
+    at a time to ints or floats when every field of the column is one.
+    """
+    with _collection_paused(), open(path, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        names = next(reader, []) if header else None
+        if rows is not None:
+            reader = islice(reader, rows)
+        if columns is None:
+            # Short rows are padded with empty fields
+            fields = list(zip_longest(*reader, fillvalue=''))
+        else:
+            fields = _pick_fields(reader, _column_indices(columns, names))
+        fields = [_convert_column(column) for column in fields]
+        if by_column:
+            return [_compact(column) for column in fields]
+        return list(map(list, zip(*fields)))
+
+
+def _column_indices(columns: List[str], names: Optional[List[str]]) -> List[int]:
+    indices = []
+    for column in columns:
+        if column.isdigit():
+            indices.append(int(column))
+        elif names is not None and column in names:
+            indices.append(names.index(column))
+        elif names is None:
+            raise GuythonRuntimeError(f"Column '{column}' needs -header to be picked by name")
+        else:
+            raise GuythonRuntimeError(f"Unknown column '{column}', columns are: {', '.join(names)}")
+    return indices
+
+
+def _pick_fields(reader: Iterator[List[str]], indices: List[int]) -> List[Sequence[str]]:
+    """The picked fields of every row, grouped by column"""
+    getter = itemgetter(*indices)
+    single = len(indices) == 1
+    picked = []
+    for row in reader:
+        try:
+            values = getter(row)
+        except IndexError:
+            values = tuple(row[index] if index < len(row) else '' for index in indices)
+            values = values[0] if single else values
+        picked.append(values)
+    if single:
+        return [picked]
+    return list(zip(*picked)) if picked else [() for _ in indices]
+
+
+def _convert_column(fields: Sequence[str]) -> List[Any]:
+    """Convert a column to ints or floats when all of it converts, otherwise field by field
+
+    A number is what _NUMBER matches either way. int() and float() also
+    take 1_000, nan and inf, which it doesn't, so a column with an
+    underscore or an n in it goes field by field.
+    """
+    text = ''.join(fields)
+    if '_' not in text:
+        try:
+            return list(map(int, fields))
+        except ValueError:
+            pass
+        if 'n' not in text and 'N' not in text:
+            try:
+                return list(map(float, fields))
+            except ValueError:
+                pass
+    return [_convert_field(field) for field in fields]
+
+
+def _convert_field(field: str) -> Any:
+    if not _NUMBER.fullmatch(field):
+        return field
+    try:
+        return int(field)
+    except ValueError:
+        return float(field)
+
+
+def _compact(values: List[Any]) -> Any:
+    """A numeric array when every value is a number, otherwise the list"""
+    if values and all(type(value) in (int, float) for value in values):
+        try:
+            return NumericArray.of_numbers(values)
+        except GuythonRuntimeError:  # Ints too large for the array
+            pass
+    return values
+
+
+def load_json(path: str, columns: Optional[List[str]] = None, rows: Optional[int] = None,
+              by_column: bool = False) -> Any:
+    """Load the records of a JSON file as a list of rows, or of columns with by_column
+
+    The records are the elements of a top-level array or the values of a
+    .jsonl or .ndjson file, parsed one at a time. Objects become rows of
+    their values, in the order of the picked keys or of the first object's
+    keys, arrays can have columns picked by index and other values are kept
+    as they are.
+    """
+    records = iter_json_values(path, path.lower().endswith(('.jsonl', '.ndjson')))
+    if rows is not None:
+        records = islice(records, rows)
+    with _collection_paused():
+        table = _json_table(path, records, columns)
+        if not by_column:
+            return table
+        if all(isinstance(row, list) for row in table):
+            return [_compact(list(column)) for column in zip_longest(*table)]
+        if any(isinstance(row, list) for row in table):
+            raise GuythonRuntimeError(f"Cannot load {path} by column, it mixes records with single values")
+        return _compact(table)
+
+
+def _json_table(path: str, records: Iterator[Any], columns: Optional[List[str]]) -> List[Any]:
+    keys = columns
+    table = []
+    for record in records:
+        if isinstance(record, dict):
+            if keys is None:
+                keys = list(record)
+            table.append([record.get(key) for key in keys])
+        elif isinstance(record, list) and columns is not None:
+            table.append([_json_field(record, column) for column in columns])
+        elif columns is not None:
+            raise GuythonRuntimeError(f"Cannot pick columns of a {type(record).__name__} in {path}")
+        else:
+            table.append(record)
+    return table
+
+
+def _json_field(record: List[Any], column: str) -> Any:
+    if not column.isdigit():
+        raise GuythonRuntimeError(f"Columns of an array record are picked by index, got '{column}'")
+    index = int(column)
+    return record[index] if index < len(record) else None
+
+
+def iter_json_values(path: str, json_lines: bool = False, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[Any]:
+    """The elements of a top-level JSON array, or each value of a JSON Lines file, read as needed
+
+    Any other JSON file holds a single value. A value that doesn't fit in
+    what has been read is retried after reading as much again, so a large
+    value is parsed a few times, not once a chunk.
+    """
+    decode = json.JSONDecoder().raw_decode
+    chunks = stream_text(path, chunk_size)
+    buffer = ''
+    at_end = False
+
+    def read(start: int, amount: int):
+        """Drop the buffer before start and read at least amount more onto it"""
+        nonlocal buffer, at_end
+        parts = [buffer[start:]]
+        size = 0
+        while size < amount:
+            chunk = next(chunks, None)
+            if chunk is None:
+                at_end = True
+                break
+            parts.append(chunk)
+            size += len(chunk)
+        buffer = ''.join(parts)
+
+    def skip(position: int) -> int:
+        while True:
+            position = _WHITESPACE.match(buffer, position).end()
+            if position < len(buffer) or at_end:
+                return position
+            read(position, chunk_size)
+            position = 0
+
+    position = skip(0)
+    in_array = not json_lines and buffer.startswith('[', position)
+    single = not json_lines and not in_array
+    if in_array:
+        separator = _ARRAY_SEPARATOR
+        position = skip(position + 1)
+        if buffer.startswith(']', position):
+            # An empty array, nothing more may follow
+            if skip(position + 1) < len(buffer):
+                raise GuythonRuntimeError(f"Invalid JSON in {path}: extra data after the value")
+            return
+    else:
+        separator = _VALUE_SEPARATOR
+
+    while position < len(buffer):
+        try:
+            value, end = decode(buffer, position)
+        except json.JSONDecodeError as e:
+            if at_end:
+                raise GuythonRuntimeError(f"Invalid JSON in {path}: {e.msg}")
+            read(position, max(chunk_size, len(buffer) - position))
+            position = 0
+            continue
+        # The separator must be whole and followed by the next value, or it may go on in the next chunk
+        match = separator.match(buffer, end)
+        if not at_end and (match is None or match.end() == len(buffer)):
+            read(position, chunk_size)
+            position = 0
+            continue
+        if match is None:
+            expected = "',' or ']'" if in_array else 'whitespace'
+            raise GuythonRuntimeError(f"Invalid JSON in {path}: expected {expected} after a value")
+        yield value
+        position = match.end()
+        if single or (in_array and match.group(1) == ']'):
+            break
+    else:
+        if in_array:
+            raise GuythonRuntimeError(f"Invalid JSON in {path}: the array is never closed")
+        return
+    if position < len(buffer):
+        raise GuythonRuntimeError(f"Invalid JSON in {path}: extra data after the value")
+
+
+def csv_writer(value: Any, header: Optional[List[str]] = None,
+               by_column: bool = False) -> Callable[[TextIO], None]:
+    """Write rows, or columns with by_column, as CSV to an open file
+
+    Lists and arrays are rows of fields, anything else is a row of one.
+    """
+    try:
+        rows = map(_fields, value)
+    except TypeError:
+        raise GuythonRuntimeError(f"Cannot save value of type {type(value).__name__} as CSV, it needs a list of rows")
+
+    def write(f: TextIO):
+        table = zip_longest(*rows, fillvalue='') if by_column else rows
+        writer = csv.writer(f, lineterminator='\n')
+        if header:
+            writer.writerow(header)
+        writer.writerows(table)
+    return write
+
+
+def _fields(row: Any) -> Any:
+    return row if isinstance(row, SEQUENCE_TYPES + (tuple,)) else (row,)
+
+
+def json_writer(value: Any) -> Callable[[TextIO], None]:
+    """Write a value as JSON to an open file, a piece at a time"""
+    encoder = json.JSONEncoder(default=_json_default)
+
+    def write(f: TextIO):
+        for chunk in encoder.iterencode(value):
+            f.write(chunk)
+    return write
+
+
+def _json_default(value: Any) -> Any:
+    """Arrays, views, ranges and file lines are saved as JSON arrays"""
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    try:
+        return list(value)
+    except TypeError:
+        raise TypeError(f"Cannot save value of type {type(value).__name__} as JSON")
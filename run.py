@@ -1,16 +1,56 @@
 import sys
 import os
+import argparse
 
 from guython.core.interpreter import GuythonInterpreter
-from guython.core.constants import VERSION
+from guython.core.constants import VERSION, MAX_LOOP_ITERATIONS, GOTO_MAX_JUMPS, MAX_CALL_DEPTH, WRITE_SYNC
+from guython.utils.fileio import SYNC_MODES
 
 from guython.core.update import check_for_updates
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Guython interpreter")
+    parser.add_argument('filename', nargs='?', help="Guython file to run (.gy or .guy)")
+    parser.add_argument('--debug', action='store_true', help="enable debug mode")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="don't read or write compiled programs in __gycache__")
+    parser.add_argument('-O', '--optimize', action='store_true',
+                        help="fold constant expressions and drop dead blocks before running")
+    parser.add_argument('--max-iterations', type=int, default=MAX_LOOP_ITERATIONS, metavar='N',
+                        help=f"stop a loop after N iterations, 0 for no limit (default {MAX_LOOP_ITERATIONS})")
+    parser.add_argument('--time-limit', type=float, default=None, metavar='SECONDS',
+                        help="stop a loop that runs longer than SECONDS")
+    parser.add_argument('--max-instructions', type=int, default=None, metavar='N',
+                        help="stop a loop that executes more than N instructions")
+    parser.add_argument('--max-jumps', type=int, default=GOTO_MAX_JUMPS, metavar='N',
+                        help=f"stop a program after N goto jumps, 0 for no limit (default {GOTO_MAX_JUMPS})")
+    parser.add_argument('--max-depth', type=int, default=MAX_CALL_DEPTH, metavar='N',
+                        help=f"limit nested function calls to N, 0 for no limit (default {MAX_CALL_DEPTH})")
+    parser.add_argument('--atomic-writes', action='store_true',
+                        help="replace files written without -add atomically, as with write -atomic")
+    parser.add_argument('--fsync', choices=SYNC_MODES, default=WRITE_SYNC,
+                        help="fsync written files never, when pending writes are flushed (batch) "
+                             f"or after every write (default {WRITE_SYNC})")
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
     interpreter = GuythonInterpreter()
+    interpreter.set_debug_mode(args.debug)
+    interpreter.set_program_cache(not args.no_cache)
+    interpreter.set_optimize(args.optimize)
+    try:
+        interpreter.set_loop_limits(args.max_iterations, args.time_limit, args.max_instructions)
+        interpreter.set_goto_limit(args.max_jumps)
+        interpreter.set_recursion_limit(args.max_depth)
+        interpreter.set_write_pool(sync=args.fsync)
+        interpreter.set_atomic_writes(args.atomic_writes)
+    except Exception as e:
+        print(f"Error: {e}")
+        sys.exit(1)
 
-    if len(sys.argv) > 1:
-        filename = sys.argv[1]
+    if args.filename:
+        filename = args.filename
         if not (filename.endswith('.gy') or filename.endswith('.guy')):
             print("Error: Invalid file type. File must be .gy or .guy")
             sys.exit(1)
@@ -20,9 +60,7 @@ def main():
             sys.exit(1)
 
         try:
-            with open(filename, 'r') as f:
-                lines = f.readlines()
-                interpreter.run_program(lines)
+            interpreter.run_file(filename)
         except Exception as e:
             print(f"Fatal error: {e}")
             sys.exit(1)
@@ -53,12 +91,12 @@ def main():
                     if not os.path.isfile(filename):
                         print(f"Error: File not found: {filename}")
                         continue
-                    with open(filename, 'r') as f:
-                        interpreter.run_program(f.readlines())
+                    interpreter.run_file(filename)
                     continue
 
                 interpreter.run_line(line)
                 interpreter.execute_remaining_loops()
+                interpreter.flush_output()
 
             except KeyboardInterrupt:
                 print("\nKeyboardInterrupt: Use 'exit' to quit.")
@@ -0,0 +1,62 @@
+"""Micro-benchmark of the fused and type-specialised ops for common Guython statement shapes
+
+Runs each pattern in a loop with superinstructions off and on and prints the
+speedup. Usage: python tool/benchmark.py [iterations]
+"""
+import io
+import os
+import sys
+import time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from guython.core.interpreter import GuythonInterpreter
+
+REPEAT = 10  # Copies of the pattern in each loop body
+
+PATTERNS = {
+    'increment (c=c+1)': ['.c=c+1'] * REPEAT,
+    'compare branch (ifc<0)': ['.ifc<0', '..c=0'] * REPEAT,
+    'print template (print"c is",c)': ['.print"c is",c'] * REPEAT,
+    'int/int binary (d=c+i)': ['.d=c+i'] * REPEAT,
+    'float/float binary (d=f*f)': ['.d=f*f'] * REPEAT,
+}
+
+
+def build_program(body, iterations):
+    """Wrap a loop body in a counting while loop"""
+    return ['c=0', 'i=0', 'f=1.5', f'whilei<{iterations}', '.i=i+1'] + body
+
+
+def time_program(lines, fused, runs=5):
+    """Best wall-clock time of running the program"""
+    best = None
+    for _ in range(runs):
+        interpreter = GuythonInterpreter()
+        interpreter.set_loop_limits(None)
+        interpreter.set_superinstructions(fused)
+        start = time.perf_counter()
+        with redirect_stdout(io.StringIO()):
+            interpreter.run_program(lines)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    print(f"{iterations} loop iterations, pattern repeated {REPEAT} times per iteration")
+    print(f"{'pattern':<34}{'general':>10}{'fused':>10}{'speedup':>9}")
+
+    cases = dict(PATTERNS)
+    cases['while loop (whilei<N)'] = []
+    for name, body in cases.items():
+        lines = build_program(body, iterations)
+        general = time_program(lines, False)
+        fused = time_program(lines, True)
+        print(f"{name:<34}{general:>9.3f}s{fused:>9.3f}s{general / fused:>8.2f}x")
+
+
+if __name__ == '__main__':
+    main()